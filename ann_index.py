@@ -0,0 +1,129 @@
+import numpy as np
+from typing import Optional, Tuple, Union
+from quantization import QuantizedVectors
+
+# Limita a memória das matrizes de distância temporárias (linhas por bloco)
+ASSIGN_CHUNK_SIZE = 8192
+
+
+def _sq_distances(queries: np.ndarray, points: np.ndarray, points_sq: np.ndarray) -> np.ndarray:
+    sq = np.einsum("ij,ij->i", queries, queries)[:, None] + points_sq[None, :]
+    sq -= 2.0 * (queries @ points.T)
+    np.maximum(sq, 0.0, out=sq)
+    return sq
+
+
+def _nearest_centroid(data: Union[np.ndarray, QuantizedVectors], centroids: np.ndarray) -> np.ndarray:
+    centroids_sq = np.einsum("ij,ij->i", centroids, centroids)
+    labels = np.empty(len(data), dtype=np.int64)
+    for start in range(0, len(data), ASSIGN_CHUNK_SIZE):
+        if isinstance(data, QuantizedVectors):
+            block = data.decode(slice(start, start + ASSIGN_CHUNK_SIZE))
+        else:
+            block = data[start:start + ASSIGN_CHUNK_SIZE]
+        labels[start:start + len(block)] = np.argmin(
+            _sq_distances(block, centroids, centroids_sq), axis=1
+        )
+    return labels
+
+
+def train_kmeans(data: np.ndarray, n_clusters: int, n_iter: int = 10,
+                 seed: int = 0) -> np.ndarray:
+    """K-means simples em numpy (inicialização aleatória, iterações de Lloyd)."""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(data.shape[0], n_clusters, replace=False)].copy()
+
+    for _ in range(n_iter):
+        labels = _nearest_centroid(data, centroids)
+        counts = np.bincount(labels, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, data)
+
+        # Clusters vazios são reiniciados em pontos aleatórios
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = data[rng.choice(data.shape[0], int(empty.sum()), replace=False)]
+
+    return centroids
+
+
+class IVFIndex:
+    """
+    Índice invertido (IVF) sobre as codificações do banco de faces.
+
+    As linhas são agrupadas por k-means em ``n_lists`` listas armazenadas de
+    forma contígua. Na busca apenas as ``n_probe`` listas mais próximas da
+    consulta são varridas; as distâncias dentro delas são exatas. As listas
+    guardam as codificações no mesmo formato do banco (ver QuantizedVectors).
+    """
+
+    def __init__(self, matrix: Union[np.ndarray, QuantizedVectors], n_lists: Optional[int] = None,
+                 n_probe: int = 8, n_iter: int = 10, train_size: int = 50000,
+                 seed: int = 0):
+        if not isinstance(matrix, QuantizedVectors):
+            matrix = QuantizedVectors.encode(matrix)
+        n = len(matrix)
+        if n == 0:
+            raise ValueError("Não é possível construir o índice com o banco vazio")
+
+        if n_lists is None:
+            n_lists = int(np.sqrt(n))
+        n_lists = max(1, min(n_lists, n))
+        self.n_probe = max(1, min(n_probe, n_lists))
+
+        # Treina em uma amostra para manter o custo de construção limitado
+        rng = np.random.default_rng(seed)
+        if n > train_size:
+            sample = matrix.decode(rng.choice(n, train_size, replace=False))
+        else:
+            sample = matrix.decode()
+        self.centroids = train_kmeans(sample, n_lists, n_iter=n_iter, seed=seed)
+        self.centroids_sq = np.einsum("ij,ij->i", self.centroids, self.centroids)
+
+        labels = _nearest_centroid(matrix, self.centroids)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=n_lists)
+
+        # Vetores reordenados por lista, com os ids originais de cada linha
+        self.ids = order.astype(np.int64)
+        self.vectors = matrix.take(order)
+        self.vectors_sq = self.vectors.sq_norms
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+
+    @property
+    def n_lists(self) -> int:
+        return self.centroids.shape[0]
+
+    def search(self, queries: np.ndarray, k: int = 1,
+               n_probe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Retorna (índices, distâncias) F x k. Posições sem candidato suficiente
+        recebem índice -1 e distância infinita.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        n_probe = self.n_probe if n_probe is None else max(1, min(n_probe, self.n_lists))
+
+        coarse = _sq_distances(queries, self.centroids, self.centroids_sq)
+        if n_probe < self.n_lists:
+            probes = np.argpartition(coarse, n_probe - 1, axis=1)[:, :n_probe]
+        else:
+            probes = np.broadcast_to(np.arange(self.n_lists), coarse.shape)
+
+        indices = np.full((queries.shape[0], k), -1, dtype=np.int64)
+        distances = np.full((queries.shape[0], k), np.inf, dtype=np.float32)
+
+        for qi, lists in enumerate(probes):
+            rows = np.concatenate([
+                np.arange(self.offsets[li], self.offsets[li + 1]) for li in lists
+            ])
+            if rows.size == 0:
+                continue
+            sq = _sq_distances(queries[qi:qi + 1], self.vectors.decode(rows), self.vectors_sq[rows])[0]
+            kk = min(k, rows.size)
+            best = np.argpartition(sq, kk - 1)[:kk] if kk < rows.size else np.arange(rows.size)
+            best = best[np.argsort(sq[best])]
+            indices[qi, :kk] = self.ids[rows[best]]
+            distances[qi, :kk] = np.sqrt(sq[best])
+
+        return indices, distances
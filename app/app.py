@@ -5,58 +5,83 @@ import cv2
 import numpy as np
 from PIL import Image
 import time
-import face_recognition
+from dataclasses import dataclass
 
 # Adiciona o diretório raiz ao caminho de importação
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Importa os módulos
-from custom_face_detection import detect_faces
-from face_identification import identify_face, load_faces
+from custom_face_detection import detect_faces, draw_detections
+from face_identification import draw_identifications, identify_face, load_faces
 from liveness_detection import detect_liveness
+from face_tracking import FaceTracker, TRACK_REVERIFY_INTERVAL
+from video_pipeline import CameraPipeline, StageTimer
+
+# Intervalo mínimo entre atualizações das métricas na tela (segundos)
+STATS_REFRESH_INTERVAL = 0.5
 
 def load_faces_with_progress():
     """
     Carrega as faces conhecidas do banco de dados e exibe uma barra de progresso no Streamlit.
     """
-    from face_identification import KNOWN_FACES_DIR, known_encodings, known_names
-    
-    
-
-    if not os.path.exists(KNOWN_FACES_DIR):
-        raise FileNotFoundError(f"Diretório de banco de dados '{KNOWN_FACES_DIR}' não encontrado")
-
-    # Lista de arquivos no diretório
-    files = [f for f in os.listdir(KNOWN_FACES_DIR) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
-    total_files = len(files)
-
-    if total_files == 0:
-        raise ValueError("Nenhuma imagem encontrada no banco de dados.")
-
     # Barra de progresso no Streamlit
     progress_bar = st.progress(0)
     status_text = st.empty()
 
-    for idx, name in enumerate(files):
-        img_path = os.path.join(KNOWN_FACES_DIR, name)
-        img = face_recognition.load_image_file(img_path)
-        encodings = face_recognition.face_encodings(img)
-
-        if encodings:
-            known_encodings.append(encodings[0])
-            known_names.append(os.path.splitext(name)[0])
-        else:
-            print(f"Aviso: Nenhuma face encontrada em {name}")
+    def on_progress(done, total, img_path):
+        progress_bar.progress(done / total)
+        status_text.text(f"Carregando: {os.path.basename(img_path)} ({done}/{total})")
 
-        # Atualiza a barra de progresso
-        progress = (idx + 1) / total_files
-        progress_bar.progress(progress)
-        status_text.text(f"Carregando: {name} ({idx + 1}/{total_files})")
+    # O cadastro paralelo e o cache ficam em face_identification.load_faces
+    load_faces(progress_callback=on_progress)
 
     # Finaliza a barra de progresso
     progress_bar.empty()
     status_text.text("Faces conhecidas carregadas com sucesso!")
 
+@dataclass
+class FrameResult:
+    detections: list
+    matches: list
+    is_live: bool
+
+def make_frame_processor(tracker: FaceTracker):
+    """
+    Processamento executado na thread do pipeline. Não acessa st.session_state
+    (que só pode ser usado pela thread do script), apenas o rastreador recebido.
+    """
+    def process_frame(frame, timer: StageTimer) -> FrameResult:
+        with timer.stage("detecção"):
+            detections = detect_faces(frame)
+
+        # Só identifica trilhas novas ou com a reverificação vencida; as
+        # demais reaproveitam a identidade em cache
+        with timer.stage("identificação"):
+            tracks = tracker.update(detections)
+            pending = [track for track in tracks if tracker.needs_identification(track)]
+            if pending:
+                new_matches = identify_face(frame, [track.face.location for track in pending])
+                for track, match in zip(pending, new_matches):
+                    tracker.set_match(track, match)
+            matches = [track.current_match for track in tracks if track.match is not None]
+
+        with timer.stage("vivacidade"):
+            is_live = detect_liveness(frame)
+
+        return FrameResult(detections, matches, is_live)
+
+    return process_frame
+
+def format_stats(stats: dict) -> str:
+    lines = [
+        f"Captura: {stats['capture_fps']:.1f} fps",
+        f"Processamento: {stats['processing_fps']:.1f} fps",
+        f"Frames descartados: {stats['dropped_frames']}",
+    ]
+    for stage, latency in stats["stage_latency_ms"].items():
+        lines.append(f"{stage}: {latency:.1f} ms")
+    return "\n".join(lines)
+
 def main():
     st.title("Sistema de Autenticação Facial")
     
@@ -65,14 +90,17 @@ def main():
         st.session_state.camera = None
     if 'fraude_detectada' not in st.session_state:
         st.session_state.fraude_detectada = False
-    if 'last_frame_time' not in st.session_state:
-        st.session_state.last_frame_time = 0
-    if 'frame_interval' not in st.session_state:
-        st.session_state.frame_interval = 0.05  # 50ms entre frames
     if 'consecutive_failures' not in st.session_state:
         st.session_state.consecutive_failures = 0
     if 'max_consecutive_failures' not in st.session_state:
         st.session_state.max_consecutive_failures = 3
+    if 'tracker' not in st.session_state:
+        st.session_state.tracker = FaceTracker()
+    
+    # Intervalo para reidentificar uma face já rastreada
+    st.session_state.tracker.reverify_interval = st.sidebar.slider(
+        "Reverificação da identidade (s)", 0.5, 10.0, TRACK_REVERIFY_INTERVAL, 0.5
+    )
     
     # Carrega as faces conhecidas do banco de dados com barra de progresso
     try:
@@ -92,6 +120,7 @@ def main():
     with col2:
         st.subheader("Status")
         status_placeholder = st.empty()
+        stats_placeholder = st.empty()
         
         # Botão para sair
         if st.button("Sair", key="exit_button_main"):
@@ -103,7 +132,7 @@ def main():
             # Reinicia o estado necessário para tentar novamente
             st.session_state.fraude_detectada = False
             st.session_state.consecutive_failures = 0
-            st.session_state.last_frame_time = 0
+            st.session_state.tracker.reset()
             st.rerun()  # Reinicia a aplicação
     
     # Inicializa a câmera se ainda não estiver inicializada
@@ -119,48 +148,67 @@ def main():
         st.session_state.camera.set(cv2.CAP_PROP_FPS, 30)
         st.session_state.camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Minimiza o buffer
     
+    # Captura e processamento rodam em threads próprias; este laço só exibe
+    # o frame mais recente com as anotações do último resultado disponível
+    pipeline = CameraPipeline(
+        st.session_state.camera.read,
+        make_frame_processor(st.session_state.tracker)
+    )
+    pipeline.start()
+    
     try:
+        frame_version = 0
+        result_version = 0
+        result = None
+        last_stats_time = 0.0
+        
         while True:
-            current_time = time.time()
-            if current_time - st.session_state.last_frame_time < st.session_state.frame_interval:
-                time.sleep(0.001)  # Pausa mínima para não sobrecarregar a CPU
-                continue
-                
-            ret, frame = st.session_state.camera.read()
-            if not ret:
-                st.error("Erro ao ler o frame da câmera")
+            frame_version, frame = pipeline.frames.get(frame_version, timeout=1.0)
+            if pipeline.error:
+                st.error(pipeline.error)
                 break
+            if frame is None:
+                continue
             
-            # Processa o frame
-            frame = detect_faces(frame)
-            frame = identify_face(frame)
+            result_version, new_result = pipeline.results.get(result_version, timeout=0)
+            if new_result is not None:
+                result = new_result
+                
+                # Verifica vivacidade (uma vez por resultado novo)
+                if not result.is_live:
+                    st.session_state.consecutive_failures += 1
+                    if st.session_state.consecutive_failures >= st.session_state.max_consecutive_failures:
+                        st.session_state.fraude_detectada = True
+                        status_placeholder.error("⚠️ Fraude suspeita detectada!")
+                        break
+                    status_placeholder.warning("⚠️ Movimento suspeito detectado...")
+                else:
+                    st.session_state.consecutive_failures = 0
+                    status_placeholder.success("✅ Sistema funcionando normalmente")
             
-            # Verifica vivacidade
-            if not detect_liveness(frame):
-                st.session_state.consecutive_failures += 1
-                if st.session_state.consecutive_failures >= st.session_state.max_consecutive_failures:
-                    st.session_state.fraude_detectada = True
-                    status_placeholder.error("⚠️ Fraude suspeita detectada!")
-                    break
-                status_placeholder.warning("⚠️ Movimento suspeito detectado...")
-            else:
-                st.session_state.consecutive_failures = 0
-                status_placeholder.success("✅ Sistema funcionando normalmente")
+            # O frame é compartilhado com a thread de processamento: anota uma cópia
+            display = frame.copy()
+            if result is not None:
+                draw_detections(display, result.detections)
+                draw_identifications(display, result.matches)
             
             # Converte o frame para exibição
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            frame_rgb = cv2.cvtColor(display, cv2.COLOR_BGR2RGB)
             frame_pil = Image.fromarray(frame_rgb)
             
             # Atualiza a interface
             camera_placeholder.image(frame_pil, use_container_width=True)
             
-            # Atualiza o tempo do último frame
-            st.session_state.last_frame_time = current_time
+            now = time.monotonic()
+            if now - last_stats_time >= STATS_REFRESH_INTERVAL:
+                stats_placeholder.text(format_stats(pipeline.stats()))
+                last_stats_time = now
             
     except Exception as e:
         st.error(f"Erro durante a execução: {str(e)}")
     finally:
         # Limpa os recursos
+        pipeline.stop()
         if st.session_state.camera is not None:
             st.session_state.camera.release()
         cv2.destroyAllWindows()
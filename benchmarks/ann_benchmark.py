@@ -0,0 +1,98 @@
+"""
+Benchmark de recall/latência do índice aproximado (IVF) contra a busca exata.
+
+Usa um banco sintético com a mesma geometria das codificações do dlib
+(distâncias intra-pessoa ~0.3, entre pessoas ~0.9). Exemplo:
+
+    python benchmarks/ann_benchmark.py --gallery-size 200000 --nprobe 4 8 16
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+# Adiciona o diretório raiz ao caminho de importação
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_gallery import ENCODING_DIM, FaceGallery
+from face_identification import FACE_MATCH_TOLERANCE, FACE_INDEX_RERANK_MARGIN
+
+
+def synthetic_encodings(n: int, rng, spread: float = 0.056) -> np.ndarray:
+    base = np.full(ENCODING_DIM, 0.8 / np.sqrt(ENCODING_DIM))
+    return (base + rng.normal(scale=spread, size=(n, ENCODING_DIM))).astype(np.float32)
+
+
+def make_dataset(gallery_size: int, n_queries: int, unknown_ratio: float,
+                 noise: float, seed: int):
+    rng = np.random.default_rng(seed)
+    gallery = synthetic_encodings(gallery_size, rng)
+
+    n_unknown = int(n_queries * unknown_ratio)
+    known_rows = rng.choice(gallery_size, n_queries - n_unknown, replace=False)
+    known = gallery[known_rows] + rng.normal(scale=noise, size=(len(known_rows), ENCODING_DIM))
+    unknown = synthetic_encodings(n_unknown, rng)
+    queries = np.concatenate([known, unknown]).astype(np.float32)
+    return gallery, queries
+
+
+def timed_search(gallery: FaceGallery, queries: np.ndarray, rerank_band):
+    indices = np.empty(len(queries), dtype=np.int64)
+    dists = np.empty(len(queries), dtype=np.float32)
+    latencies = []
+    # Uma consulta por vez, como em uma requisição de /authenticate/
+    for qi in range(len(queries)):
+        start = time.perf_counter()
+        idx, dist = gallery.top_k(queries[qi:qi + 1], 1, rerank_band)
+        latencies.append(time.perf_counter() - start)
+        indices[qi], dists[qi] = idx[0, 0], dist[0, 0]
+    return indices, dists, np.array(latencies) * 1000.0
+
+
+def summarize(name, latencies, recall, agreement):
+    print(f"{name:<22} p50={np.percentile(latencies, 50):8.3f}ms "
+          f"p95={np.percentile(latencies, 95):8.3f}ms "
+          f"recall@1={recall:6.4f} decisões iguais={agreement:6.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--gallery-size", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--unknown-ratio", type=float, default=0.3)
+    parser.add_argument("--noise", type=float, default=0.02)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--margin", type=float, default=FACE_INDEX_RERANK_MARGIN)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    gallery_matrix, queries = make_dataset(
+        args.gallery_size, args.queries, args.unknown_ratio, args.noise, args.seed
+    )
+    gallery = FaceGallery(gallery_matrix, [str(i) for i in range(len(gallery_matrix))])
+    band = (FACE_MATCH_TOLERANCE - args.margin, FACE_MATCH_TOLERANCE + args.margin)
+
+    exact_idx, exact_dists, exact_lat = timed_search(gallery, queries, None)
+    exact_match = exact_dists <= FACE_MATCH_TOLERANCE
+    summarize("exata", exact_lat, 1.0, 1.0)
+
+    start = time.perf_counter()
+    gallery.build_index("ivf", n_lists=args.nlist, seed=args.seed)
+    print(f"índice ivf: {gallery.index.n_lists} listas, "
+          f"construção em {time.perf_counter() - start:.2f}s")
+
+    for nprobe in args.nprobe:
+        gallery.index.n_probe = max(1, min(nprobe, gallery.index.n_lists))
+        for label, rerank in (("", None), ("+rerank", band)):
+            idx, dists, lat = timed_search(gallery, queries, rerank)
+            recall = float(np.mean(idx == exact_idx))
+            match = dists <= FACE_MATCH_TOLERANCE
+            # Decisão igual: mesmo resultado (aceito/recusado) e mesma identidade quando aceito
+            agreement = float(np.mean((match == exact_match) & (~match | (idx == exact_idx))))
+            summarize(f"ivf nprobe={nprobe}{label}", lat, recall, agreement)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Benchmark offline do pipeline de reconhecimento e vivacidade.
+
+Mede latência por etapa (p50/p95/p99), pico de memória e requisições/s do
+endpoint /authenticate/ via TestClient em vários níveis de concorrência, com
+um banco sintético de tamanho configurável. As imagens de --images precisam
+conter faces: as codificações delas entram no banco, para que detecção,
+codificação e comparação sejam medidas no caminho de uma autenticação real.
+O resultado é gravado em JSON para comparar execuções entre commits. Exemplo:
+
+    python benchmarks/pipeline_benchmark.py --images fixtures/ \\
+        --gallery-sizes 100 10000 --concurrency 1 4 8 --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+import cv2
+import numpy as np
+
+# Adiciona o diretório raiz ao caminho de importação
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+import face_identification
+from custom_face_detection import detect_faces
+from face_gallery import ENCODING_DIM
+from face_identification import build_gallery, encode_faces, match_encodings
+from liveness_detection import LivenessDetector
+
+
+def percentiles(samples_s) -> dict:
+    values = np.array(samples_s) * 1000.0
+    if values.size == 0:
+        return {"n": 0}
+    return {
+        "n": int(values.size),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "mean_ms": float(values.mean()),
+    }
+
+
+def load_fixture_images(directory: str):
+    """Frames das imagens com face e a codificação da primeira face de cada uma."""
+    frames = []
+    encodings = []
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(('.png', '.jpg', '.jpeg')):
+            continue
+        frame = cv2.imread(os.path.join(directory, name))
+        if frame is None:
+            print(f"Aviso: não foi possível ler {name}")
+            continue
+        _, face_encodings = encode_faces(frame, [face.location for face in detect_faces(frame)])
+        if not face_encodings:
+            print(f"Aviso: nenhuma face encontrada em {name}, imagem ignorada")
+            continue
+        frames.append(frame)
+        encodings.append(face_encodings[0])
+    return frames, encodings
+
+
+def install_synthetic_gallery(size: int, seed: int, known_encodings):
+    """Banco com ``size`` codificações sintéticas mais as faces das imagens de teste."""
+    rng = np.random.default_rng(seed)
+    encodings = np.concatenate([
+        rng.normal(scale=0.1, size=(size, ENCODING_DIM)), np.asarray(known_encodings)
+    ])
+    names = [f"pessoa_{i}" for i in range(size)] + [f"fixture_{i}" for i in range(len(known_encodings))]
+    face_identification.set_gallery(build_gallery(encodings, names), snapshot={}, notify=False)
+
+
+def bench_stages(payloads, frames, iterations: int) -> dict:
+    timings = {name: [] for name in
+               ("decode", "detect_faces", "encode_faces", "match", "liveness", "total")}
+    detector = LivenessDetector()
+
+    for _ in range(iterations):
+        for payload in payloads:
+            start = time.perf_counter()
+            frame = cv2.imdecode(np.frombuffer(payload, np.uint8), cv2.IMREAD_COLOR)
+            t_decode = time.perf_counter()
+            detections = detect_faces(frame)
+            t_detect = time.perf_counter()
+            _, encodings = encode_faces(frame, [face.location for face in detections])
+            t_encode = time.perf_counter()
+            match_encodings(encodings)
+            t_match = time.perf_counter()
+            detector.analyze(frame)
+            t_liveness = time.perf_counter()
+
+            timings["decode"].append(t_decode - start)
+            timings["detect_faces"].append(t_detect - t_decode)
+            timings["encode_faces"].append(t_encode - t_detect)
+            timings["match"].append(t_match - t_encode)
+            timings["liveness"].append(t_liveness - t_match)
+            timings["total"].append(t_liveness - start)
+
+    return {name: percentiles(samples) for name, samples in timings.items()}
+
+
+def bench_match(gallery_size: int, faces_per_frame: int, iterations: int, seed: int) -> dict:
+    rng = np.random.default_rng(seed + 1)
+    queries = rng.normal(scale=0.1, size=(faces_per_frame, ENCODING_DIM))
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        match_encodings(queries)
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def api_client(gallery_size: int, seed: int, known_encodings):
+    """
+    TestClient do app com o lifespan completo (aquecimento dos modelos,
+    agendador de lotes), mas com o banco sintético no lugar do diretório.
+    Use com ``with``.
+    """
+    from fastapi.testclient import TestClient
+    import main as app_main
+
+    app_main.load_faces = lambda: install_synthetic_gallery(gallery_size, seed, known_encodings)
+    app_main.SHARED_GALLERY_DIR = None
+    app_main.GALLERY_WATCH_INTERVAL = 0
+    return TestClient(app_main.app)
+
+
+def bench_api(client, payloads, concurrency: int, requests_per_worker: int) -> dict:
+    latencies = []
+    status_codes = {}
+    lock = threading.Lock()
+
+    def worker(worker_id: int):
+        for i in range(requests_per_worker):
+            payload = payloads[(worker_id + i) % len(payloads)]
+            start = time.perf_counter()
+            response = client.post(
+                "/authenticate/", files={"file": ("frame.jpg", payload, "image/jpeg")}
+            )
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                status_codes[response.status_code] = status_codes.get(response.status_code, 0) + 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    result = percentiles(latencies)
+    result.update({
+        "concurrency": concurrency,
+        "requests_per_second": len(latencies) / wall if wall > 0 else 0.0,
+        "status_codes": {str(code): count for code, count in status_codes.items()},
+    })
+    return result
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconhecido"
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", required=True, help="Diretório com imagens de teste com faces")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--gallery-sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--faces-per-frame", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--requests", type=int, default=20, help="Requisições por worker")
+    parser.add_argument("--skip-api", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_output.json")
+    args = parser.parse_args()
+
+    frames, known_encodings = load_fixture_images(args.images)
+    if not frames:
+        parser.error(f"nenhuma imagem com face encontrada em {args.images}")
+    payloads = [cv2.imencode(".jpg", frame)[1].tobytes() for frame in frames]
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "params": vars(args),
+        "fixtures": {"source": args.images, "count": len(frames),
+                     "shape": list(frames[0].shape)},
+        "match": {},
+        "api": [],
+    }
+
+    for size in args.gallery_sizes:
+        install_synthetic_gallery(size, args.seed, known_encodings)
+        report["match"][str(size)] = bench_match(
+            size, args.faces_per_frame, args.iterations * 50, args.seed
+        )
+        print(f"match  banco={size:<8} {report['match'][str(size)]}")
+
+    install_synthetic_gallery(max(args.gallery_sizes), args.seed, known_encodings)
+    tracemalloc.start()
+    report["stages"] = bench_stages(payloads, frames, args.iterations)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    report["memory"] = {"tracemalloc_peak_mb": peak / (1024 * 1024)}
+    for stage, stats in report["stages"].items():
+        print(f"etapa  {stage:<14} {stats}")
+
+    if not args.skip_api:
+        with api_client(max(args.gallery_sizes), args.seed, known_encodings) as client:
+            from models import registry
+            report["warmup_seconds"] = registry.warmup_seconds
+            for concurrency in args.concurrency:
+                result = bench_api(client, payloads, concurrency, args.requests)
+                report["api"].append(result)
+                print(f"api    concorrência={concurrency:<3} {result['requests_per_second']:.1f} req/s "
+                      f"p95={result.get('p95_ms', 0):.1f}ms {result['status_codes']}")
+
+    report["memory"]["peak_rss_mb"] = peak_rss_mb()
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Resultados gravados em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
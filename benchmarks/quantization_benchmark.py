@@ -0,0 +1,107 @@
+"""
+Precisão e memória do banco quantizado (float16, int8) contra a referência float64.
+
+Compara, para cada consulta, o melhor candidato e a decisão de autenticação
+(distância <= FACE_MATCH_TOLERANCE) com os da busca exata em float64. Usa um
+banco sintético ou codificações reais (ex.: a matriz do cache em
+database/.cache/encodings-*.npy). Exemplo:
+
+    python benchmarks/quantization_benchmark.py --gallery-size 1000000 --queries 2000
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+# Adiciona o diretório raiz ao caminho de importação
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ann_benchmark import make_dataset, synthetic_encodings
+from face_gallery import ENCODING_DIM, FaceGallery
+from face_identification import FACE_MATCH_TOLERANCE
+from quantization import STORAGE_TYPES
+
+# Consultas comparadas por bloco na referência float64
+BASELINE_CHUNK = 256
+
+
+def baseline_top1(gallery: np.ndarray, queries: np.ndarray):
+    """Melhor linha e distância de cada consulta, em float64."""
+    gallery = gallery.astype(np.float64)
+    gallery_sq = np.einsum("ij,ij->i", gallery, gallery)
+    indices = np.empty(len(queries), dtype=np.int64)
+    dists = np.empty(len(queries))
+    for start in range(0, len(queries), BASELINE_CHUNK):
+        block = queries[start:start + BASELINE_CHUNK].astype(np.float64)
+        sq = np.einsum("ij,ij->i", block, block)[:, None] + gallery_sq[None, :] - 2.0 * block @ gallery.T
+        best = np.argmin(sq, axis=1)
+        indices[start:start + len(block)] = best
+        dists[start:start + len(block)] = np.sqrt(np.maximum(sq[np.arange(len(block)), best], 0.0))
+    return indices, dists
+
+
+def load_dataset(args):
+    if args.encodings is None:
+        return make_dataset(args.gallery_size, args.queries, args.unknown_ratio,
+                            args.noise, args.seed)
+
+    rng = np.random.default_rng(args.seed)
+    gallery = np.load(args.encodings).astype(np.float32)
+    n_unknown = int(args.queries * args.unknown_ratio)
+    rows = rng.choice(len(gallery), min(args.queries - n_unknown, len(gallery)), replace=False)
+    known = gallery[rows] + rng.normal(scale=args.noise, size=(len(rows), ENCODING_DIM))
+    unknown = synthetic_encodings(n_unknown, rng)
+    return gallery, np.concatenate([known, unknown]).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--gallery-size", type=int, default=200000)
+    parser.add_argument("--encodings", help="Arquivo .npy (N x 128) com codificações reais")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--unknown-ratio", type=float, default=0.3)
+    parser.add_argument("--noise", type=float, default=0.025,
+                        help="Ruído das consultas de pessoas cadastradas")
+    parser.add_argument("--tolerance", type=float, default=FACE_MATCH_TOLERANCE)
+    parser.add_argument("--storage", nargs="+", default=list(STORAGE_TYPES), choices=STORAGE_TYPES)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    gallery_matrix, queries = load_dataset(args)
+    n = len(gallery_matrix)
+    names = [str(i) for i in range(n)]
+    print(f"Banco: {n} codificações, {len(queries)} consultas, tolerância {args.tolerance}")
+
+    start = time.perf_counter()
+    ref_idx, ref_dist = baseline_top1(gallery_matrix, queries)
+    print(f"Referência float64: {time.perf_counter() - start:.2f}s")
+    ref_auth = ref_dist <= args.tolerance
+    near = np.abs(ref_dist - args.tolerance) <= 0.01
+    print(f"Autenticadas: {ref_auth.mean():.4f}  "
+          f"a até 0.01 da tolerância: {int(near.sum())}")
+
+    for storage in args.storage:
+        gallery = FaceGallery(gallery_matrix, names, storage=storage)
+        latencies = []
+        indices = np.empty(len(queries), dtype=np.int64)
+        dists = np.empty(len(queries))
+        # Uma consulta por vez, como em uma requisição de /authenticate/
+        for qi in range(len(queries)):
+            t0 = time.perf_counter()
+            idx, dist = gallery.exact_top_k(queries[qi:qi + 1], 1)
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+            indices[qi], dists[qi] = idx[0, 0], dist[0, 0]
+
+        auth = dists <= args.tolerance
+        error = np.abs(dists - ref_dist)
+        print(f"{storage:<8} bytes/vetor={gallery.vectors.nbytes / n:6.1f} "
+              f"p50={np.percentile(latencies, 50):8.3f}ms "
+              f"top1 igual={np.mean(indices == ref_idx):.4f} "
+              f"decisões iguais={np.mean(auth == ref_auth):.4f} "
+              f"(trocadas: {int(np.sum(auth != ref_auth))}) "
+              f"erro dist. médio={error.mean():.2e} máx={error.max():.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Compara o pipeline em modo "roi" (recorte da face) com o modo "full" (frame
+inteiro): decisões de identificação, distâncias, métricas de qualidade,
+vivacidade e tempo por etapa. Exemplo:
+
+    python benchmarks/roi_comparison.py --images fotos_teste/ --video tentativa.mp4
+"""
+import argparse
+import os
+import sys
+import time
+import cv2
+import numpy as np
+
+# Adiciona o diretório raiz ao caminho de importação
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from custom_face_detection import detect_faces
+from face_identification import FACE_MATCH_TOLERANCE, encode_faces, load_faces, match_encodings
+from face_roi import detect_faces_downscaled, extract_face_roi, largest_face
+from liveness_detection import LivenessDetector
+
+
+def decide(encodings):
+    if not encodings:
+        return None, None, None
+    name, distance = match_encodings(encodings[:1], k=1)[0][0]
+    return (name if distance <= FACE_MATCH_TOLERANCE else None), distance, encodings[0]
+
+
+def run_full(frame):
+    start = time.perf_counter()
+    face = largest_face(detect_faces(frame))
+    _, encodings = encode_faces(frame, [face.location] if face else None)
+    result = decide(encodings)
+    quality = LivenessDetector().analyze_image_quality(frame)
+    return result, quality, time.perf_counter() - start
+
+
+def run_roi(frame):
+    start = time.perf_counter()
+    face = largest_face(detect_faces_downscaled(frame))
+    if face is None:
+        return (None, None, None), None, time.perf_counter() - start
+    roi = extract_face_roi(frame, face)
+    _, encodings = encode_faces(roi.crop, [roi.location])
+    result = decide(encodings)
+    quality = LivenessDetector().analyze_image_quality(roi.crop)
+    return result, quality, time.perf_counter() - start
+
+
+def compare_images(paths):
+    same_decision = 0
+    same_quality = 0
+    dist_deltas = []
+    enc_deltas = []
+    times = {"full": [], "roi": []}
+
+    for path in paths:
+        frame = cv2.imread(path)
+        if frame is None:
+            print(f"Aviso: não foi possível ler {path}")
+            continue
+
+        (full_name, full_dist, full_enc), full_quality, full_t = run_full(frame)
+        (roi_name, roi_dist, roi_enc), roi_quality, roi_t = run_roi(frame)
+        times["full"].append(full_t)
+        times["roi"].append(roi_t)
+
+        same_decision += full_name == roi_name
+        same_quality += full_quality == roi_quality
+        if full_dist is not None and roi_dist is not None:
+            dist_deltas.append(abs(full_dist - roi_dist))
+            enc_deltas.append(float(np.linalg.norm(full_enc - roi_enc)))
+        if full_name != roi_name:
+            print(f"Divergência em {os.path.basename(path)}: full={full_name} ({full_dist}) "
+                  f"roi={roi_name} ({roi_dist})")
+
+    n = len(times["full"])
+    if n == 0:
+        print("Nenhuma imagem processada")
+        return
+
+    print(f"Imagens: {n}")
+    print(f"Decisões de identificação iguais: {same_decision}/{n}")
+    print(f"Decisões de qualidade iguais:     {same_quality}/{n}")
+    if dist_deltas:
+        print(f"|Δ distância| média={np.mean(dist_deltas):.4f} máx={np.max(dist_deltas):.4f}")
+        print(f"Distância entre codificações full/roi média={np.mean(enc_deltas):.4f} "
+              f"máx={np.max(enc_deltas):.4f}")
+    for mode, values in times.items():
+        values = np.array(values) * 1000.0
+        print(f"Tempo {mode:<4} p50={np.percentile(values, 50):7.1f}ms "
+              f"p95={np.percentile(values, 95):7.1f}ms")
+
+
+def compare_video(path, max_frames):
+    capture = cv2.VideoCapture(path)
+    # Cada modo com seu FaceMesh: o rastreamento não pode misturar frames
+    # inteiros e recortes
+    full_detector = LivenessDetector(own_face_mesh=True)
+    roi_detector = LivenessDetector(own_face_mesh=True)
+    same = 0
+    frames = 0
+    full_result = roi_result = True
+
+    while frames < max_frames:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        frames += 1
+
+        full_result = full_detector.detect_liveness(frame)
+        face = largest_face(detect_faces_downscaled(frame))
+        if face is None:
+            roi_result = roi_detector.detect_liveness(frame)
+        else:
+            roi = extract_face_roi(frame, face)
+            roi_result = roi_detector.detect_liveness(roi.crop, roi)
+        same += full_result == roi_result
+
+    capture.release()
+    full_detector.close()
+    roi_detector.close()
+    print(f"Vídeo: {frames} frames, respostas de vivacidade iguais: {same}/{frames}")
+    print(f"Decisão final full={full_result} (confirmada={full_detector.is_confirmed}) "
+          f"roi={roi_result} (confirmada={roi_detector.is_confirmed})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", help="Diretório com imagens de teste")
+    parser.add_argument("--video", help="Vídeo de uma tentativa para comparar a vivacidade")
+    parser.add_argument("--max-frames", type=int, default=300)
+    args = parser.parse_args()
+
+    if not args.images and not args.video:
+        parser.error("informe --images e/ou --video")
+
+    load_faces()
+
+    if args.images:
+        paths = sorted(
+            os.path.join(args.images, name) for name in os.listdir(args.images)
+            if name.lower().endswith(('.png', '.jpg', '.jpeg'))
+        )
+        compare_images(paths)
+    if args.video:
+        compare_video(args.video, args.max_frames)
+
+
+if __name__ == "__main__":
+    main()
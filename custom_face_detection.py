@@ -1,38 +1,40 @@
 import cv2
-import mediapipe as mp
 import numpy as np
+from dataclasses import dataclass
+from typing import List, Tuple
+from metrics import time_stage
+# Detector criado sob demanda, um por thread (ver models.ModelRegistry)
+from models import get_face_detector
 
-mp_face_detection = mp.solutions.face_detection
-mp_drawing = mp.solutions.drawing_utils
+@dataclass
+class DetectedFace:
+    x: int
+    y: int
+    width: int
+    height: int
+    confidence: float
 
-# Cache para o detector de faces
-face_detection = None
+    @property
+    def location(self) -> Tuple[int, int, int, int]:
+        """Caixa no formato do dlib/face_recognition: (top, right, bottom, left)."""
+        return (self.y, self.x + self.width, self.y + self.height, self.x)
 
-def get_face_detector():
-    global face_detection
-    if face_detection is None:
-        face_detection = mp_face_detection.FaceDetection(
-            min_detection_confidence=0.7,  # Aumentado para maior precisão
-            model_selection=0  # 0 para rostos próximos
-        )
-    return face_detection
-
-def detect_faces(frame):
+def detect_faces(frame) -> List[DetectedFace]:
     if frame is None or frame.size == 0:
         raise ValueError("Frame inválido fornecido")
     
-    # Mantém a resolução original do frame
-    original_size = frame.shape[:2]
+    detections = []
     
     try:
         # Usa o detector em cache
         face_detection = get_face_detector()
-        results = face_detection.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        with time_stage("detect_mediapipe"):
+            results = face_detection.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
         
         if results.detections:
+            h, w = frame.shape[:2]
             for detection in results.detections:
                 bboxC = detection.location_data.relative_bounding_box
-                h, w, _ = frame.shape
                 bbox = int(bboxC.xmin * w), int(bboxC.ymin * h), \
                        int(bboxC.width * w), int(bboxC.height * h)
                 
@@ -42,17 +44,24 @@ def detect_faces(frame):
                 y = max(0, min(y, h))
                 width = min(width, w - x)
                 height = min(height, h - y)
+                if width <= 0 or height <= 0:
+                    continue
                 
-                # Desenha o retângulo
-                cv2.rectangle(frame, (x, y), (x + width, y + height), (0, 255, 0), 2)
-                
-                # Adiciona texto de confiança
-                confidence = detection.score[0]
-                cv2.putText(frame, f"Conf: {confidence:.2f}", 
-                           (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 
-                           0.5, (0, 255, 0), 2)
+                detections.append(DetectedFace(x, y, width, height, float(detection.score[0])))
                 
     except Exception as e:
         print(f"Erro na detecção facial: {str(e)}")
         
+    return detections
+
+def draw_detections(frame, detections: List[DetectedFace]):
+    for face in detections:
+        x, y = face.x, face.y
+        # Desenha o retângulo
+        cv2.rectangle(frame, (x, y), (x + face.width, y + face.height), (0, 255, 0), 2)
+        
+        # Adiciona texto de confiança
+        cv2.putText(frame, f"Conf: {face.confidence:.2f}", 
+                   (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 
+                   0.5, (0, 255, 0), 2)
     return frame
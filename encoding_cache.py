@@ -0,0 +1,325 @@
+import hashlib
+import json
+import os
+import uuid
+import numpy as np
+from typing import Dict, Iterable, List, Optional
+
+# Versão do formato em disco; incrementar invalida caches antigos
+CACHE_FORMAT_VERSION = 3
+ENCODING_DIM = 128
+# Tipo das codificações gravadas na matriz e no journal (o banco é float32
+# ou mais compacto, então float64 só dobraria o disco e a leitura)
+CACHE_DTYPE = np.float32
+# O journal é incorporado à matriz quando passa do tamanho dela (e deste mínimo)
+JOURNAL_COMPACT_MIN_BYTES = 1 << 20
+
+INDEX_FILE = "index.json"
+JOURNAL_FILE = "journal.jsonl"
+
+
+def file_sha1(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class EncodingCache:
+    """
+    Cache persistente das codificações faciais do banco de dados.
+
+    As codificações ficam em uma matriz ``encodings-<geração>.npy`` (lida com
+    memory-map) e os metadados em ``index.json``, indexados pelo caminho
+    relativo da imagem com tamanho, mtime e hash SHA-1 do conteúdo.
+
+    Cadastros e remoções pela API não regravam esses arquivos: append()
+    acrescenta uma linha por imagem a ``journal.jsonl`` (a codificação, ou a
+    remoção da entrada). load() aplica o journal sobre a matriz e save()
+    incorpora tudo em uma geração nova, com o journal vazio.
+    """
+
+    def __init__(self, cache_dir: str, base_dir: str):
+        self.cache_dir = cache_dir
+        self.base_dir = base_dir
+        self.entries: Dict[str, dict] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._pending: Dict[str, Optional[np.ndarray]] = {}
+        self._matrix_file: Optional[str] = None
+        self.dirty = False
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.cache_dir, INDEX_FILE)
+
+    @property
+    def journal_path(self) -> str:
+        return os.path.join(self.cache_dir, JOURNAL_FILE)
+
+    def _key(self, path: str) -> str:
+        return os.path.relpath(path, self.base_dir).replace(os.sep, "/")
+
+    def load(self):
+        self.entries = {}
+        self._matrix = None
+        self._pending = {}
+        self._matrix_file = None
+        self.dirty = False
+
+        if not os.path.exists(self.index_path):
+            return
+
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("version") != CACHE_FORMAT_VERSION:
+                print("Aviso: Cache de codificações em formato antigo, será reconstruído")
+                self.dirty = True
+                return
+
+            matrix_file = index["matrix"]
+            matrix = np.load(os.path.join(self.cache_dir, matrix_file), mmap_mode="r")
+            if matrix.ndim != 2 or matrix.shape[1] != ENCODING_DIM:
+                raise ValueError(f"Formato de matriz inválido: {matrix.shape}")
+
+            self.entries = index["entries"]
+            self._matrix = matrix
+            self._matrix_file = matrix_file
+            generation = index["generation"]
+        except Exception as e:
+            print(f"Aviso: Cache de codificações corrompido, será reconstruído: {str(e)}")
+            self.entries = {}
+            self._matrix = None
+            self.dirty = True
+            return
+
+        for record in self._read_journal(generation):
+            key = record["key"]
+            if record.get("removed"):
+                self.entries.pop(key, None)
+                self._pending.pop(key, None)
+                continue
+            self.entries[key] = {
+                "size": record["size"],
+                "mtime_ns": record["mtime_ns"],
+                "sha1": record["sha1"],
+                "row": None,
+            }
+            encoding = record["encoding"]
+            self._pending[key] = None if encoding is None else np.asarray(encoding, dtype=CACHE_DTYPE)
+            # A próxima gravação completa incorpora o journal à matriz
+            self.dirty = True
+
+    def _read_journal(self, generation: str) -> List[dict]:
+        """Registros do journal de ``generation`` (os de outra geração já estão na matriz)."""
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return []
+        records = []
+        for number, line in enumerate(lines):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Linha incompleta de uma gravação interrompida
+                print(f"Aviso: Linha {number + 1} do journal do cache ignorada")
+                continue
+            if number == 0:
+                if record.get("generation") != generation:
+                    return []
+                continue
+            records.append(record)
+        return records
+
+    def _journal_generation(self) -> Optional[str]:
+        """Geração do journal atual, lida só da primeira linha."""
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                return json.loads(f.readline()).get("generation")
+        except (OSError, ValueError, AttributeError):
+            return None
+
+    def append(self, updates: Dict[str, Optional[np.ndarray]], removed: Iterable[str] = ()):
+        """
+        Registra codificações novas (None quando não há face) e imagens
+        removidas sem ler nem regravar o cache: o custo não depende do tamanho
+        do banco. Sem um cache gravado antes, ou com o journal maior que a
+        matriz, faz uma gravação completa.
+        """
+        if self._journal_generation() is None:
+            self._rewrite(updates, removed)
+            return
+
+        lines = []
+        for path in removed:
+            lines.append(json.dumps({"key": self._key(path), "removed": True}))
+        for path, encoding in updates.items():
+            stat = os.stat(path)
+            lines.append(json.dumps({
+                "key": self._key(path),
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha1": file_sha1(path),
+                "encoding": None if encoding is None
+                else np.asarray(encoding, dtype=CACHE_DTYPE).tolist(),
+            }))
+        if not lines:
+            return
+        # Uma única escrita em modo append por chamada
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+            journal_size = f.tell()
+
+        try:
+            matrix_size = max(
+                os.path.getsize(os.path.join(self.cache_dir, name))
+                for name in os.listdir(self.cache_dir) if name.startswith("encodings-")
+            )
+        except (OSError, ValueError):
+            matrix_size = 0
+        if journal_size > max(matrix_size, JOURNAL_COMPACT_MIN_BYTES):
+            self.load()
+            self.save()
+
+    def _rewrite(self, updates: Dict[str, Optional[np.ndarray]], removed: Iterable[str]):
+        self.load()
+        for path in removed:
+            key = self._key(path)
+            self.entries.pop(key, None)
+            self._pending.pop(key, None)
+        for path, encoding in updates.items():
+            self.update(path, encoding)
+        self.dirty = True
+        self.save()
+
+    def is_fresh(self, path: str) -> bool:
+        """
+        Retorna True se a codificação em cache ainda corresponde ao arquivo.
+        Arquivos com mtime alterado mas conteúdo idêntico são revalidados pelo hash.
+        """
+        entry = self.entries.get(self._key(path))
+        if entry is None:
+            return False
+
+        stat = os.stat(path)
+        if entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return True
+
+        if entry["size"] != stat.st_size or entry["sha1"] != file_sha1(path):
+            return False
+
+        # Conteúdo igual (ex.: arquivo copiado ou "tocado"): só atualiza o mtime
+        entry["mtime_ns"] = stat.st_mtime_ns
+        self.dirty = True
+        return True
+
+    def stale_files(self, paths: Iterable[str]) -> List[str]:
+        return [path for path in paths if not self.is_fresh(path)]
+
+    def get(self, path: str) -> Optional[np.ndarray]:
+        """Codificação em cache: a linha da matriz mapeada, sem cópia (somente leitura)."""
+        key = self._key(path)
+        if key in self._pending:
+            return self._pending[key]
+
+        entry = self.entries.get(key)
+        if entry is None or entry["row"] is None or self._matrix is None:
+            return None
+        return self._matrix[entry["row"]]
+
+    def update(self, path: str, encoding: Optional[np.ndarray]):
+        """Registra a codificação de um arquivo (None quando não há face)."""
+        key = self._key(path)
+        stat = os.stat(path)
+        self.entries[key] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha1": file_sha1(path),
+            "row": None,
+        }
+        self._pending[key] = encoding
+        self.dirty = True
+
+    def prune(self, paths: Iterable[str]) -> int:
+        """Remove do cache os arquivos que não existem mais no banco de dados."""
+        keep = {self._key(path) for path in paths}
+        removed = [key for key in self.entries if key not in keep]
+        for key in removed:
+            del self.entries[key]
+            self._pending.pop(key, None)
+        if removed:
+            self.dirty = True
+        return len(removed)
+
+    def save(self):
+        if not self.dirty:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # Compacta as linhas na ordem dos caminhos para manter o arquivo estável
+        rows = []
+        entries = {}
+        for key in sorted(self.entries):
+            entry = dict(self.entries[key])
+            if key in self._pending:
+                encoding = self._pending[key]
+            elif entry["row"] is not None and self._matrix is not None:
+                encoding = self._matrix[entry["row"]]
+            else:
+                encoding = None
+
+            if encoding is None:
+                entry["row"] = None
+            else:
+                entry["row"] = len(rows)
+                rows.append(np.asarray(encoding, dtype=CACHE_DTYPE))
+            entries[key] = entry
+
+        if rows:
+            matrix = np.stack(rows)
+        else:
+            matrix = np.empty((0, ENCODING_DIM), dtype=CACHE_DTYPE)
+
+        # Cada gravação gera um arquivo de matriz novo; a troca do índice com
+        # os.replace é o único passo atômico, então um leitor nunca combina
+        # um índice novo com uma matriz antiga (ou vice-versa). O journal da
+        # geração anterior passa a ser ignorado no mesmo passo
+        generation = uuid.uuid4().hex
+        matrix_file = f"encodings-{generation}.npy"
+        with open(os.path.join(self.cache_dir, matrix_file), "wb") as f:
+            np.save(f, matrix)
+
+        # Nome único: processos sem lock comum (ex.: app Streamlit) não
+        # disputam o mesmo arquivo temporário
+        tmp_index = f"{self.index_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_index, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": CACHE_FORMAT_VERSION,
+                "generation": generation,
+                "matrix": matrix_file,
+                "entries": entries,
+            }, f)
+        os.replace(tmp_index, self.index_path)
+
+        tmp_journal = f"{self.journal_path}.{generation}.tmp"
+        with open(tmp_journal, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"generation": generation}) + "\n")
+        os.replace(tmp_journal, self.journal_path)
+
+        # Libera o memory-map antigo antes de apagar o arquivo (necessário no Windows)
+        old_matrix_file = self._matrix_file
+        self._matrix = None
+        if old_matrix_file and old_matrix_file != matrix_file:
+            try:
+                os.remove(os.path.join(self.cache_dir, old_matrix_file))
+            except OSError:
+                pass
+
+        self.entries = entries
+        self._pending = {}
+        self._matrix = np.load(os.path.join(self.cache_dir, matrix_file), mmap_mode="r")
+        self._matrix_file = matrix_file
+        self.dirty = False
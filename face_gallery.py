@@ -0,0 +1,154 @@
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+from ann_index import IVFIndex
+from quantization import QuantizedVectors
+
+ENCODING_DIM = 128
+
+# Candidato de identificação: (nome, distância)
+Candidate = Tuple[str, float]
+
+
+class FaceGallery:
+    """
+    Banco de faces em memória: codificações (N x 128) contíguas com os nomes
+    correspondentes a cada linha. Imutável depois de construída.
+
+    ``storage`` escolhe o formato das codificações: "float32" (padrão),
+    "float16" ou "int8" com escala por vetor (ver quantization.QuantizedVectors).
+    """
+
+    def __init__(self, encodings, names: Sequence[str], storage: str = "float32"):
+        if isinstance(encodings, QuantizedVectors):
+            vectors = encodings
+        else:
+            matrix = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+            vectors = QuantizedVectors.encode(matrix, storage)
+        if vectors.dim != ENCODING_DIM:
+            raise ValueError(f"Codificações com dimensão {vectors.dim}, esperado {ENCODING_DIM}")
+        if len(vectors) != len(names):
+            raise ValueError(
+                f"Quantidade de codificações ({len(vectors)}) diferente da de nomes ({len(names)})"
+            )
+        self.vectors = vectors
+        self.names: List[str] = list(names)
+        # Linhas (modelos) de cada pessoa, para a verificação 1:1
+        rows: Dict[str, List[int]] = {}
+        for row, name in enumerate(self.names):
+            rows.setdefault(name, []).append(row)
+        self.rows_by_name: Dict[str, np.ndarray] = {
+            name: np.array(name_rows, dtype=np.int64) for name, name_rows in rows.items()
+        }
+        # Índice aproximado opcional (ver build_index)
+        self.index: Optional[IVFIndex] = None
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """Codificações em float32 (reconstruídas, ou seja, uma cópia, quando quantizadas)."""
+        return self.vectors.decode()
+
+    @property
+    def sq_norms(self) -> np.ndarray:
+        # Normas ao quadrado pré-calculadas para a distância euclidiana expandida
+        return self.vectors.sq_norms
+
+    @property
+    def storage(self) -> str:
+        return self.vectors.storage
+
+    @classmethod
+    def empty(cls) -> "FaceGallery":
+        return cls(np.empty((0, ENCODING_DIM), dtype=np.float32), [])
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def distances(self, queries) -> np.ndarray:
+        """
+        Distâncias euclidianas entre todas as codificações de consulta (F x 128)
+        e todas as linhas do banco, em uma única multiplicação de matrizes (F x N).
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        # ||q - g||² = ||q||² + ||g||² - 2 q·g
+        sq = self.vectors.sq_distances(queries)
+        return np.sqrt(sq, out=sq)
+
+    def template_count(self, name: str) -> int:
+        rows = self.rows_by_name.get(name)
+        return 0 if rows is None else len(rows)
+
+    def identity_distances(self, query, name: str) -> np.ndarray:
+        """
+        Distâncias entre uma codificação e os modelos de ``name`` apenas
+        (custo proporcional ao número de modelos, não ao tamanho do banco).
+        """
+        rows = self.rows_by_name.get(name)
+        if rows is None:
+            raise KeyError(name)
+        query = np.asarray(query, dtype=np.float32).reshape(1, ENCODING_DIM)
+        return np.sqrt(self.vectors.take(rows).sq_distances(query)[0])
+
+    def build_index(self, kind: str = "exact", **params):
+        """
+        Constrói o índice de busca: "exact" (varredura completa) ou "ivf"
+        (aproximado, ver ann_index.IVFIndex).
+        """
+        if kind == "exact" or len(self) == 0:
+            self.index = None
+        elif kind == "ivf":
+            self.index = IVFIndex(self.vectors, **params)
+        else:
+            raise ValueError(f"Tipo de índice desconhecido: {kind}")
+
+    def top_k(self, queries, k: int = 1,
+              rerank_band: Optional[Tuple[float, float]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Retorna (índices, distâncias), ambos F x k, ordenados da menor para a
+        maior distância.
+
+        Com índice aproximado, consultas cuja melhor distância cai dentro de
+        ``rerank_band`` (mínimo, máximo), ou que ficaram sem candidato, são
+        refeitas com a busca exata.
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        if self.index is None:
+            return self.exact_top_k(queries, k)
+
+        k = min(k, len(self))
+        indices, dists = self.index.search(queries, k)
+        if k == 0:
+            return indices, dists
+
+        best = dists[:, 0]
+        redo = indices[:, 0] < 0
+        if rerank_band is not None:
+            low, high = rerank_band
+            redo |= (best >= low) & (best <= high)
+        if redo.any():
+            exact_idx, exact_dists = self.exact_top_k(queries[redo], k)
+            indices[redo] = exact_idx
+            dists[redo] = exact_dists
+        return indices, dists
+
+    def exact_top_k(self, queries, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        dists = self.distances(queries)
+        k = min(k, len(self))
+        if k == 0:
+            empty = np.empty((dists.shape[0], 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+
+        if k < len(self):
+            idx = np.argpartition(dists, k - 1, axis=1)[:, :k]
+        else:
+            idx = np.broadcast_to(np.arange(len(self)), dists.shape).copy()
+        part = np.take_along_axis(dists, idx, axis=1)
+        order = np.argsort(part, axis=1)
+        return np.take_along_axis(idx, order, axis=1), np.take_along_axis(part, order, axis=1)
+
+    def search(self, queries, k: int = 1,
+               rerank_band: Optional[Tuple[float, float]] = None) -> List[List[Candidate]]:
+        indices, dists = self.top_k(queries, k, rerank_band)
+        return [
+            [(self.names[i], float(d)) for i, d in zip(row_idx, row_dist) if i >= 0]
+            for row_idx, row_dist in zip(indices, dists)
+        ]
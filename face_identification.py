@@ -1,82 +1,532 @@
-import face_recognition
+import io
+import multiprocessing
 import os
+import re
+import threading
+import uuid
 import numpy as np
 import cv2
-from typing import List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, ContextManager, Dict, List, Optional, Tuple
+from encoding_cache import EncodingCache
+from face_gallery import ENCODING_DIM, Candidate, FaceGallery
+from quantization import QuantizedVectors
+from metrics import time_stage
+from models import get_face_recognition
 
 KNOWN_FACES_DIR = "database"
 FACE_MATCH_TOLERANCE = 0.5
+# Quantidade de candidatos retornados por face
+FACE_MATCH_TOP_K = 3
+# Índice de busca: "exact" (varredura completa) ou "ivf" (aproximado)
+FACE_INDEX_TYPE = os.environ.get("FACE_INDEX_TYPE", "exact")
+# Abaixo deste tamanho o índice aproximado não compensa e a busca é exata
+FACE_INDEX_MIN_SIZE = int(os.environ.get("FACE_INDEX_MIN_SIZE", 20000))
+FACE_INDEX_NLIST = int(os.environ.get("FACE_INDEX_NLIST", 0)) or None  # None = sqrt(N)
+FACE_INDEX_NPROBE = int(os.environ.get("FACE_INDEX_NPROBE", 8))
+# Consultas a esta distância de FACE_MATCH_TOLERANCE são refeitas com busca exata
+FACE_INDEX_RERANK_MARGIN = float(os.environ.get("FACE_INDEX_RERANK_MARGIN", 0.05))
+# Formato das codificações em memória: "float32", "float16" ou "int8"
+# (ver benchmarks/quantization_benchmark.py para o impacto na precisão)
+FACE_GALLERY_STORAGE = os.environ.get("FACE_GALLERY_STORAGE", "float32")
+# Cache persistente das codificações (None desativa)
+ENCODING_CACHE_DIR = os.path.join(KNOWN_FACES_DIR, ".cache")
+# Cadastro paralelo: número de processos e imagens enviadas por tarefa
+ENROLLMENT_WORKERS = int(os.environ.get("ENROLLMENT_WORKERS", os.cpu_count() or 1))
+ENROLLMENT_CHUNKSIZE = int(os.environ.get("ENROLLMENT_CHUNKSIZE", 4))
+# Intervalo de verificação do diretório do banco em segundos (0 desativa)
+GALLERY_WATCH_INTERVAL = float(os.environ.get("GALLERY_WATCH_INTERVAL", 0))
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+# Nomes aceitos no cadastro pela API (viram nomes de arquivo)
+FACE_NAME_PATTERN = re.compile(r"^[\w\- ]{1,64}$")
 
-known_encodings: List[np.ndarray] = []
-known_names: List[str] = []
+# Callback de progresso: (concluídas, total, caminho da imagem)
+ProgressCallback = Callable[[int, int, str], None]
 
-def load_faces():
+@dataclass
+class FaceMatch:
+    location: Tuple[int, int, int, int]   # (top, right, bottom, left)
+    name: Optional[str]                   # melhor candidato do banco
+    distance: Optional[float]
+    authenticated: bool
+    candidates: List[Candidate] = field(default_factory=list)
+
+# Banco de faces carregado. Nunca é alterado no lugar: cada recarga ou
+# cadastro publica uma instância nova, então quem já pegou a referência
+# continua com um snapshot consistente
+gallery = FaceGallery.empty()
+# Serializa recargas e cadastros (os leitores não usam lock)
+_gallery_lock = threading.RLock()
+# Tamanho e mtime dos arquivos quando o banco foi publicado pela última vez
+_loaded_snapshot: Dict[str, Tuple[int, int]] = {}
+# Chamados com cada banco novo construído neste processo (ex.: shared_gallery)
+gallery_publishers: List[Callable[[FaceGallery], None]] = []
+# Envolvem cada cadastro ou remoção inteiro, das imagens e do cache ao banco
+# novo calculado a partir do atual (ex.: shared_gallery adquire o lock entre processos e carrega a
+# versão mais recente, para não descartar cadastros feitos em outro worker)
+gallery_update_guards: List[Callable[[], ContextManager]] = []
+
+def get_gallery() -> FaceGallery:
+    return gallery
+
+def loaded_snapshot() -> Dict[str, Tuple[int, int]]:
+    return _loaded_snapshot
+
+def set_gallery(new_gallery: FaceGallery,
+                snapshot: Optional[Dict[str, Tuple[int, int]]] = None,
+                notify: bool = True):
+    """
+    Publica ``new_gallery`` substituindo a referência global. ``snapshot`` é o
+    estado do diretório que o banco representa (padrão: o estado atual).
+    """
+    global gallery, _loaded_snapshot
+
+    with _gallery_lock:
+        gallery = new_gallery
+        _loaded_snapshot = directory_snapshot() if snapshot is None else snapshot
+        if notify:
+            for publish in gallery_publishers:
+                publish(new_gallery)
+
+def list_face_images() -> List[str]:
+    """
+    Imagens do banco: ``database/<nome>.jpg`` (uma imagem) e
+    ``database/<nome>/*.jpg`` (vários modelos da mesma pessoa). Diretórios
+    ocultos (cache, segmentos compartilhados) são ignorados.
+    """
+    paths = []
+    for entry in sorted(os.listdir(KNOWN_FACES_DIR)):
+        full_path = os.path.join(KNOWN_FACES_DIR, entry)
+        if entry.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(full_path):
+            paths.append(full_path)
+        elif os.path.isdir(full_path) and not entry.startswith("."):
+            paths.extend(
+                os.path.join(full_path, name) for name in sorted(os.listdir(full_path))
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            )
+    return paths
+
+def identity_for_path(path: str) -> str:
+    """Nome da pessoa: o diretório da imagem, ou o nome do arquivo no nível raiz."""
+    parent = os.path.dirname(path)
+    if os.path.normpath(parent) != os.path.normpath(KNOWN_FACES_DIR):
+        return os.path.basename(parent)
+    return os.path.splitext(os.path.basename(path))[0]
+
+def directory_snapshot() -> Dict[str, Tuple[int, int]]:
+    snapshot = {}
+    for path in list_face_images():
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+def encode_image_file(img_path) -> Optional[np.ndarray]:
+    face_recognition = get_face_recognition()
+    img = face_recognition.load_image_file(img_path)
+    encodings = face_recognition.face_encodings(img)
+    if not encodings:
+        return None
+    # Usa a primeira codificação facial se múltiplas forem encontradas
+    return encodings[0]
+
+def encode_image_files(paths: List[str],
+                       workers: Optional[int] = None,
+                       chunksize: Optional[int] = None,
+                       progress_callback: Optional[ProgressCallback] = None) -> List[Optional[np.ndarray]]:
+    """
+    Codifica as imagens em paralelo em um pool de processos.
+    O resultado segue a mesma ordem de ``paths`` (None quando não há face).
+    """
+    workers = ENROLLMENT_WORKERS if workers is None else workers
+    chunksize = ENROLLMENT_CHUNKSIZE if chunksize is None else chunksize
+    total = len(paths)
+    workers = max(1, min(workers, total))
+
+    if workers == 1:
+        results = map(encode_image_file, paths)
+        return _collect_encodings(results, paths, progress_callback)
+
+    # spawn: o processo pode ter threads (pipeline, MediaPipe, BLAS, o
+    # GalleryWatcher) e um fork nesse estado pode travar os filhos
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=multiprocessing.get_context("spawn")) as executor:
+        # executor.map preserva a ordem de entrada independentemente de
+        # qual processo termina primeiro
+        results = executor.map(encode_image_file, paths, chunksize=max(1, chunksize))
+        return _collect_encodings(results, paths, progress_callback)
+
+def _collect_encodings(results, paths: List[str],
+                       progress_callback: Optional[ProgressCallback]) -> List[Optional[np.ndarray]]:
+    encodings = []
+    for idx, encoding in enumerate(results):
+        encodings.append(encoding)
+        if progress_callback is not None:
+            progress_callback(idx + 1, len(paths), paths[idx])
+    return encodings
+
+def open_encoding_cache(paths: List[str]) -> Optional[EncodingCache]:
+    """
+    Abre o cache de codificações e descarta entradas de arquivos removidos.
+    Retorna None se o cache estiver desativado.
+    """
+    if ENCODING_CACHE_DIR is None:
+        return None
+    cache = EncodingCache(ENCODING_CACHE_DIR, KNOWN_FACES_DIR)
+    cache.load()
+    removed = cache.prune(paths)
+    if removed:
+        print(f"Cache: {removed} imagem(ns) removida(s) do banco de dados")
+    return cache
+
+def append_encoding_cache(updates: Dict[str, Optional[np.ndarray]], removed: List[str]):
+    """Registra um cadastro ou remoção no cache sem regravá-lo (ver EncodingCache.append)."""
+    if ENCODING_CACHE_DIR is None:
+        return
+    try:
+        EncodingCache(ENCODING_CACHE_DIR, KNOWN_FACES_DIR).append(updates, removed)
+    except OSError as e:
+        # A imagem já está no banco; sem o registro ela é codificada na próxima carga
+        print(f"Aviso: Não foi possível gravar o cache de codificações: {str(e)}")
+
+def save_encoding_cache(cache: Optional[EncodingCache]):
+    if cache is None:
+        return
+    try:
+        cache.save()
+    except OSError as e:
+        # Falha ao gravar o cache não impede o serviço de subir
+        print(f"Aviso: Não foi possível gravar o cache de codificações: {str(e)}")
+
+def build_gallery(encodings, names: List[str]) -> FaceGallery:
+    """``encodings``: matriz N x 128 ou QuantizedVectors já no formato final."""
+    new_gallery = FaceGallery(encodings, names, storage=FACE_GALLERY_STORAGE)
+    if FACE_INDEX_TYPE != "exact" and len(new_gallery) >= FACE_INDEX_MIN_SIZE:
+        new_gallery.build_index(
+            FACE_INDEX_TYPE, n_lists=FACE_INDEX_NLIST, n_probe=FACE_INDEX_NPROBE
+        )
+        print(f"Índice {FACE_INDEX_TYPE} construído para {len(new_gallery)} faces")
+    return new_gallery
+
+def load_faces(progress_callback: Optional[ProgressCallback] = None,
+               workers: Optional[int] = None,
+               chunksize: Optional[int] = None):
+    """
+    (Re)carrega o banco a partir do diretório. Só as imagens novas ou
+    alteradas são codificadas (ver EncodingCache); o banco novo substitui o
+    anterior de uma vez.
+    """
     if not os.path.exists(KNOWN_FACES_DIR):
         raise FileNotFoundError(f"Diretório de banco de dados '{KNOWN_FACES_DIR}' não encontrado")
-        
+
+    with _gallery_lock:
+        _load_faces(progress_callback, workers, chunksize)
+
+def _load_faces(progress_callback, workers, chunksize):
     try:
-        for name in os.listdir(KNOWN_FACES_DIR):
-            if not name.lower().endswith(('.png', '.jpg', '.jpeg')):
-                continue
-                
-            img_path = os.path.join(KNOWN_FACES_DIR, name)
-            img = face_recognition.load_image_file(img_path)
-            encodings = face_recognition.face_encodings(img)
-            
-            if not encodings:
-                print(f"Aviso: Nenhuma face encontrada em {name}")
+        # Capturado antes da listagem: alterações posteriores disparam outra recarga
+        snapshot = directory_snapshot()
+        # Linhas da matriz mapeada do cache (sem cópia) ou codificações novas
+        encodings: List[np.ndarray] = []
+        names: List[str] = []
+        paths = list_face_images()
+        cache = open_encoding_cache(paths)
+        stale = cache.stale_files(paths) if cache is not None else paths
+        if cache is not None and stale:
+            print(f"Cache: codificando {len(stale)} de {len(paths)} imagem(ns)")
+
+        new_encodings = dict(zip(stale, encode_image_files(
+            stale, workers=workers, chunksize=chunksize,
+            progress_callback=progress_callback
+        )))
+        if cache is not None:
+            for img_path, encoding in new_encodings.items():
+                cache.update(img_path, encoding)
+            # Gravado antes: as codificações novas também passam a ser lidas da matriz mapeada
+            save_encoding_cache(cache)
+
+        for img_path in paths:
+            if img_path in new_encodings:
+                encoding = new_encodings[img_path]
+            else:
+                encoding = cache.get(img_path)
+
+            if encoding is None:
+                print(f"Aviso: Nenhuma face encontrada em {os.path.relpath(img_path, KNOWN_FACES_DIR)}")
                 continue
                 
-            # Usa a primeira codificação facial se múltiplas forem encontradas
-            known_encodings.append(encodings[0])
-            known_names.append(os.path.splitext(name)[0])
-            
-        if not known_encodings:
+            encodings.append(encoding)
+            names.append(identity_for_path(img_path))
+
+        if not encodings:
             raise ValueError("Nenhuma codificação facial válida encontrada no banco de dados")
+
+        # Convertidas em blocos direto para FACE_GALLERY_STORAGE
+        vectors = QuantizedVectors.encode_rows(encodings, ENCODING_DIM, FACE_GALLERY_STORAGE)
+        set_gallery(build_gallery(vectors, names), snapshot)
             
     except Exception as e:
         print(f"Erro ao carregar faces: {str(e)}")
         raise
 
-def identify_face(frame):
+def face_image_paths(name: str) -> List[str]:
+    """
+    Imagens de ``name`` (as mesmas de list_face_images), sem consultar os
+    arquivos e diretórios das outras pessoas.
+    """
+    paths = [
+        os.path.join(KNOWN_FACES_DIR, entry) for entry in sorted(os.listdir(KNOWN_FACES_DIR))
+        if os.path.splitext(entry)[0] == name and entry.lower().endswith(IMAGE_EXTENSIONS)
+        and os.path.isfile(os.path.join(KNOWN_FACES_DIR, entry))
+    ]
+    directory = os.path.join(KNOWN_FACES_DIR, name)
+    if not name.startswith(".") and os.path.isdir(directory):
+        paths.extend(
+            os.path.join(directory, entry) for entry in sorted(os.listdir(directory))
+            if entry.lower().endswith(IMAGE_EXTENSIONS)
+        )
+    return paths
+
+@contextmanager
+def _update_guards():
+    """
+    Entra em todos os gallery_update_guards. Envolve o cadastro ou remoção
+    inteiro (imagens, cache de codificações e banco novo), para que dois
+    workers nunca gravem o diretório ou o cache ao mesmo tempo.
+    """
+    with ExitStack() as stack:
+        for guard in gallery_update_guards:
+            stack.enter_context(guard())
+        yield
+
+def _publish_update(name: str, encoding: Optional[np.ndarray] = None, replace: bool = True,
+                    path: Optional[str] = None):
+    """
+    Publica um banco novo com ``encoding`` (a imagem ``path``) como modelo de
+    ``name``. Com ``replace`` os modelos anteriores de ``name`` são
+    descartados. O estado do diretório registrado é o do banco de partida com
+    as mesmas alterações, e não o diretório atual, que pode ter imagens que
+    o banco ainda não contém (ex.: cadastradas em outro worker).
+
+    Chamado dentro de _update_guards.
+    """
+    current = gallery
+    if replace:
+        keep = [idx for idx, row_name in enumerate(current.names) if row_name != name]
+        snapshot = {
+            image_path: value for image_path, value in _loaded_snapshot.items()
+            if identity_for_path(image_path) != name
+        }
+    else:
+        keep = list(range(len(current)))
+        snapshot = dict(_loaded_snapshot)
+    # As linhas mantidas são reaproveitadas sem requantizar
+    vectors = current.vectors.take(keep)
+    if vectors.storage != FACE_GALLERY_STORAGE:
+        vectors = QuantizedVectors.encode(vectors.decode(), FACE_GALLERY_STORAGE)
+    names = [current.names[idx] for idx in keep]
+    if encoding is not None:
+        vectors = QuantizedVectors.concatenate([
+            vectors, QuantizedVectors.encode(np.asarray(encoding)[None, :], FACE_GALLERY_STORAGE)
+        ])
+        names.append(name)
+    if path is not None:
+        stat = os.stat(path)
+        snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+
+    set_gallery(build_gallery(vectors, names), snapshot)
+
+def enroll_face(name: str, image_data: bytes, replace: bool) -> FaceGallery:
+    """
+    Cadastra a face ``name`` a partir dos bytes de uma imagem. Com ``replace``
+    a imagem substitui todos os modelos da pessoa; caso contrário é gravada
+    como um modelo a mais em ``database/<nome>/``. Só a imagem nova é
+    codificada; o restante do banco é reaproveitado.
+    """
+    if not FACE_NAME_PATTERN.match(name):
+        raise ValueError("Nome inválido: use letras, números, espaço, '_' ou '-'")
+
+    try:
+        encoding = encode_image_file(io.BytesIO(image_data))
+    except Exception:
+        raise ValueError("Formato de imagem inválido")
+    if encoding is None:
+        raise ValueError("Nenhuma face encontrada na imagem")
+
+    extension = ".png" if image_data.startswith(b"\x89PNG") else ".jpg"
+    if replace:
+        path = os.path.join(KNOWN_FACES_DIR, name + extension)
+    else:
+        path = os.path.join(KNOWN_FACES_DIR, name, uuid.uuid4().hex[:12] + extension)
+
+    with _gallery_lock, _update_guards():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Escrita atômica: o arquivo temporário não tem extensão de imagem
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(image_data)
+        os.replace(tmp_path, path)
+        removed = []
+        if replace:
+            for old_path in face_image_paths(name):
+                if old_path != path:
+                    os.remove(old_path)
+                    removed.append(old_path)
+            _remove_empty_dir(name)
+
+        append_encoding_cache({path: encoding}, removed)
+        _publish_update(name, encoding, replace, path)
+        return get_gallery()
+
+def remove_face(name: str) -> int:
+    """Remove as imagens de ``name`` do banco. Retorna quantas foram removidas."""
+    with _gallery_lock, _update_guards():
+        paths = face_image_paths(name)
+        for path in paths:
+            os.remove(path)
+        if not paths:
+            return 0
+        _remove_empty_dir(name)
+
+        append_encoding_cache({}, paths)
+        _publish_update(name)
+        return len(paths)
+
+def _remove_empty_dir(name: str):
+    directory = os.path.join(KNOWN_FACES_DIR, name)
+    if os.path.isdir(directory) and not os.listdir(directory):
+        os.rmdir(directory)
+
+class GalleryWatcher:
+    """
+    Verifica periodicamente o diretório do banco e recarrega as faces quando
+    imagens são adicionadas, alteradas ou removidas fora da API. ``reload``
+    substitui load_faces (ex.: SharedGallery.reload, para que só um worker
+    recarregue).
+    """
+
+    def __init__(self, interval: float = GALLERY_WATCH_INTERVAL,
+                 reload: Optional[Callable[[], None]] = None):
+        self.interval = interval
+        self.reload = load_faces if reload is None else reload
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="gallery-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if directory_snapshot() != _loaded_snapshot:
+                    print("Banco de faces alterado, recarregando")
+                    # _gallery_lock antes de qualquer lock do reload, na mesma
+                    # ordem dos cadastros (_gallery_lock e depois os guards)
+                    with _gallery_lock:
+                        self.reload()
+            except Exception as e:
+                # O banco anterior continua publicado
+                print(f"Erro ao recarregar faces: {str(e)}")
+
+def match_encodings(face_encodings, k: int = FACE_MATCH_TOP_K) -> List[List[Candidate]]:
+    """
+    Compara todas as codificações (de um ou vários frames) com o banco de uma
+    só vez e retorna os k melhores candidatos (nome, distância) de cada face.
+    """
+    if len(face_encodings) == 0:
+        return []
+    rerank_band = (
+        FACE_MATCH_TOLERANCE - FACE_INDEX_RERANK_MARGIN,
+        FACE_MATCH_TOLERANCE + FACE_INDEX_RERANK_MARGIN,
+    )
+    with time_stage("match"):
+        return get_gallery().search(np.asarray(face_encodings), k, rerank_band)
+
+def verify_encoding(face_encoding, identity: str) -> Optional[float]:
+    """
+    Menor distância entre a codificação e os modelos de ``identity`` (1:1),
+    ou None se a identidade não estiver cadastrada.
+    """
+    current = get_gallery()
+    if current.template_count(identity) == 0:
+        return None
+    with time_stage("match"):
+        return float(current.identity_distances(face_encoding, identity).min())
+
+def encode_faces(frame, face_locations: Optional[List[Tuple[int, int, int, int]]] = None):
+    """
+    Retorna (localizações, codificações) das faces do frame BGR. As
+    localizações seguem o formato do dlib (top, right, bottom, left); sem
+    ``face_locations`` (ou com a lista vazia) a detecção HOG do dlib é usada.
+    """
+    face_recognition = get_face_recognition()
+    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    if not face_locations:
+        with time_stage("detect_hog"):
+            face_locations = face_recognition.face_locations(rgb_frame)
+    with time_stage("encode"):
+        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+    return face_locations, face_encodings
+
+def identify_face(frame, face_locations: Optional[List[Tuple[int, int, int, int]]] = None) -> List[FaceMatch]:
+    """
+    Identifica as faces do frame sem alterá-lo. ``face_locations`` vindas de
+    um detector anterior são repassadas para encode_faces.
+    """
     if frame is None or frame.size == 0:
         raise ValueError("Frame inválido fornecido")
         
-    if not known_encodings:
+    if len(get_gallery()) == 0:
         raise ValueError("Nenhuma face conhecida carregada. Chame load_faces() primeiro.")
         
     try:
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        face_locations = face_recognition.face_locations(rgb_frame)
-        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+        face_locations, face_encodings = encode_faces(frame, face_locations)
 
         if not face_locations:
             print("Nenhuma face detectada no frame")
-            return frame
-
-        for face_encoding, face_location in zip(face_encodings, face_locations):
-            matches = face_recognition.compare_faces(
-                known_encodings, 
-                face_encoding, 
-                tolerance=FACE_MATCH_TOLERANCE
-            )
-            name = "Desconhecido"
+            return []
 
-            if any(matches):
-                face_distances = face_recognition.face_distance(known_encodings, face_encoding)
-                best_match_index = np.argmin(face_distances)
-                name = "Autenticado"
-                print("Rosto autenticado com sucesso")
-            else:
-                print("Rosto não reconhecido.")
-
-            top, right, bottom, left = face_location
-            cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-            cv2.putText(frame, name, (left, top - 10), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-
-        return frame
+        return build_matches(face_locations, match_encodings(face_encodings))
         
     except Exception as e:
         print(f"Erro na identificação facial: {str(e)}")
-        return frame
+        return []
+
+def build_matches(face_locations, candidates_per_face: List[List[Candidate]]) -> List[FaceMatch]:
+    """Converte os candidatos de cada face (ver match_encodings) em FaceMatch."""
+    matches = []
+    for candidates, face_location in zip(candidates_per_face, face_locations):
+        name, distance = candidates[0] if candidates else (None, None)
+        authenticated = distance is not None and distance <= FACE_MATCH_TOLERANCE
+
+        if authenticated:
+            print("Rosto autenticado com sucesso")
+        else:
+            print("Rosto não reconhecido.")
+
+        matches.append(FaceMatch(
+            tuple(int(v) for v in face_location), name, distance, authenticated, candidates
+        ))
+
+    return matches
+
+def draw_identifications(frame, matches: List[FaceMatch]):
+    for match in matches:
+        name = "Autenticado" if match.authenticated else "Desconhecido"
+        top, right, bottom, left = match.location
+        cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
+        cv2.putText(frame, name, (left, top - 10), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+    return frame
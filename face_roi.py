@@ -0,0 +1,97 @@
+import os
+import cv2
+import numpy as np
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from custom_face_detection import DetectedFace, detect_faces
+
+# Modo do pipeline: "full" (frame inteiro) ou "roi" (recorte da face)
+PIPELINE_MODE = os.environ.get("PIPELINE_MODE", "full")
+# Largura do frame reduzido usado só para localizar a face
+ROI_DETECTION_WIDTH = int(os.environ.get("ROI_DETECTION_WIDTH", 320))
+# Margem em torno da caixa da face, em fração do maior lado
+ROI_PADDING = float(os.environ.get("ROI_PADDING", 0.4))
+# Lado do recorte normalizado entregue ao FaceMesh, métricas e codificação
+ROI_SIZE = int(os.environ.get("ROI_SIZE", 256))
+
+
+@dataclass
+class FaceROI:
+    crop: np.ndarray                      # recorte redimensionado (ROI_SIZE x ROI_SIZE)
+    box: Tuple[int, int, int, int]        # (x, y, lado, lado) do recorte; pode passar das bordas do frame
+    frame_shape: Tuple[int, int]          # (altura, largura) do frame original
+    face: DetectedFace                    # face em coordenadas do frame original
+
+    @property
+    def location(self) -> Tuple[int, int, int, int]:
+        """Caixa da face dentro do recorte, no formato (top, right, bottom, left)."""
+        x, y, w, h = self.box
+        sx = self.crop.shape[1] / w
+        sy = self.crop.shape[0] / h
+        top, right, bottom, left = self.face.location
+        return (int((top - y) * sy), int((right - x) * sx),
+                int((bottom - y) * sy), int((left - x) * sx))
+
+    def landmarks_to_frame(self, landmarks: np.ndarray,
+                           out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Converte landmarks normalizados ao recorte para normalizados ao frame
+        original, para que movimento e piscadas sejam medidos como no modo "full".
+        ``out`` pode ser o próprio ``landmarks`` (conversão no lugar).
+        """
+        x, y, w, h = self.box
+        frame_h, frame_w = self.frame_shape
+        if out is None:
+            out = np.empty_like(landmarks)
+        # Coluna a coluna com out=, sem temporários: (x + lx * w) / frame_w
+        np.multiply(landmarks[:, 0], w / frame_w, out=out[:, 0])
+        out[:, 0] += x / frame_w
+        np.multiply(landmarks[:, 1], h / frame_h, out=out[:, 1])
+        out[:, 1] += y / frame_h
+        # O z do MediaPipe usa a mesma escala que x
+        np.multiply(landmarks[:, 2], w / frame_w, out=out[:, 2])
+        return out
+
+
+def detect_faces_downscaled(frame, max_width: int = ROI_DETECTION_WIDTH) -> List[DetectedFace]:
+    """Detecta faces em uma cópia reduzida do frame e devolve as caixas na escala original."""
+    h, w = frame.shape[:2]
+    if w <= max_width:
+        return detect_faces(frame)
+
+    scale = max_width / w
+    small = cv2.resize(frame, (max_width, int(round(h * scale))), interpolation=cv2.INTER_AREA)
+    return [
+        DetectedFace(
+            int(face.x / scale), int(face.y / scale),
+            min(int(face.width / scale), w), min(int(face.height / scale), h),
+            face.confidence
+        )
+        for face in detect_faces(small)
+    ]
+
+
+def largest_face(detections: List[DetectedFace]) -> Optional[DetectedFace]:
+    return max(detections, key=lambda face: face.width * face.height, default=None)
+
+
+def extract_face_roi(frame, face: DetectedFace, padding: float = ROI_PADDING,
+                     size: int = ROI_SIZE) -> FaceROI:
+    h, w = frame.shape[:2]
+
+    # Recorte quadrado centrado na face; perto das bordas a parte fora do frame
+    # é preenchida com preto, para o redimensionamento não distorcer a face
+    side = max(1, int(max(face.width, face.height) * (1 + 2 * padding)))
+    x0 = face.x + face.width // 2 - side // 2
+    y0 = face.y + face.height // 2 - side // 2
+    cx0, cy0 = max(0, x0), max(0, y0)
+    cx1, cy1 = min(w, x0 + side), min(h, y0 + side)
+
+    crop = frame[cy0:cy1, cx0:cx1]
+    if crop.shape[0] != side or crop.shape[1] != side:
+        crop = cv2.copyMakeBorder(
+            crop, cy0 - y0, y0 + side - cy1, cx0 - x0, x0 + side - cx1,
+            cv2.BORDER_CONSTANT, value=0
+        )
+    crop = cv2.resize(crop, (size, size), interpolation=cv2.INTER_AREA)
+    return FaceROI(crop, (x0, y0, side, side), (h, w), face)
@@ -0,0 +1,99 @@
+import time
+from dataclasses import dataclass, replace
+from typing import List, Optional
+from custom_face_detection import DetectedFace
+from face_identification import FaceMatch
+
+# Sobreposição mínima (IoU) para considerar a mesma face entre frames
+TRACK_IOU_THRESHOLD = 0.3
+# Frames sem detecção antes de descartar a trilha
+TRACK_MAX_MISSES = 5
+# Intervalo para reidentificar uma trilha já identificada (segundos)
+TRACK_REVERIFY_INTERVAL = 2.0
+
+
+@dataclass
+class Track:
+    track_id: int
+    face: DetectedFace
+    match: Optional[FaceMatch] = None
+    verified_at: float = 0.0
+    misses: int = 0
+
+    @property
+    def current_match(self) -> Optional[FaceMatch]:
+        """Identidade em cache, com a caixa atualizada para o frame atual."""
+        if self.match is None:
+            return None
+        return replace(self.match, location=self.face.location)
+
+
+def iou(a: DetectedFace, b: DetectedFace) -> float:
+    x0 = max(a.x, b.x)
+    y0 = max(a.y, b.y)
+    x1 = min(a.x + a.width, b.x + b.width)
+    y1 = min(a.y + a.height, b.y + b.height)
+    inter = max(0, x1 - x0) * max(0, y1 - y0)
+    union = a.width * a.height + b.width * b.height - inter
+    return inter / union if union > 0 else 0.0
+
+
+class FaceTracker:
+    """
+    Rastreador simples por IoU. Mantém o ID de cada face entre frames para
+    que a identificação (codificação de 128 dimensões) só rode quando uma
+    trilha nova aparece ou quando o intervalo de reverificação expira.
+    """
+
+    def __init__(self, iou_threshold: float = TRACK_IOU_THRESHOLD,
+                 max_misses: int = TRACK_MAX_MISSES,
+                 reverify_interval: float = TRACK_REVERIFY_INTERVAL):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.reverify_interval = reverify_interval
+        self.tracks: List[Track] = []
+        self._next_id = 1
+
+    def update(self, detections: List[DetectedFace]) -> List[Track]:
+        """Associa as detecções do frame às trilhas e retorna as trilhas visíveis."""
+        # Associação gulosa pelos pares de maior IoU
+        pairs = sorted(
+            ((iou(track.face, face), ti, di)
+             for ti, track in enumerate(self.tracks)
+             for di, face in enumerate(detections)),
+            reverse=True
+        )
+        used_tracks = set()
+        used_detections = set()
+        for overlap, ti, di in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if ti in used_tracks or di in used_detections:
+                continue
+            used_tracks.add(ti)
+            used_detections.add(di)
+            self.tracks[ti].face = detections[di]
+            self.tracks[ti].misses = 0
+
+        for ti, track in enumerate(self.tracks):
+            if ti not in used_tracks:
+                track.misses += 1
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses]
+
+        for di, face in enumerate(detections):
+            if di not in used_detections:
+                self.tracks.append(Track(self._next_id, face))
+                self._next_id += 1
+
+        return [track for track in self.tracks if track.misses == 0]
+
+    def needs_identification(self, track: Track, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        return track.match is None or now - track.verified_at >= self.reverify_interval
+
+    def set_match(self, track: Track, match: FaceMatch, now: Optional[float] = None):
+        track.match = match
+        track.verified_at = time.monotonic() if now is None else now
+
+    def reset(self):
+        self.tracks = []
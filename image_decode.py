@@ -0,0 +1,124 @@
+import os
+import cv2
+import numpy as np
+from typing import Optional, Tuple
+
+# Tamanho máximo aceito para uma imagem enviada (bytes)
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", 10 * 1024 * 1024))
+# Maior lado que o pipeline precisa; JPEGs maiores são decodificados em escala reduzida
+DECODE_TARGET_SIDE = int(os.environ.get("DECODE_TARGET_SIDE", 960))
+# Resolução máxima aceita (largura x altura), verificada pelo cabeçalho antes de
+# decodificar. JPEGs são decodificados a até 1/8 da escala (24 MP: câmera de 6000x4000)
+IMAGE_MAX_PIXELS = int(os.environ.get("IMAGE_MAX_PIXELS", 24_000_000))
+# Formatos decodificados em resolução total (PNG e outros): o custo cresce com
+# os pixels e não com os bytes, então o limite é próximo do que o pipeline usa
+IMAGE_MAX_FULL_PIXELS = int(os.environ.get("IMAGE_MAX_FULL_PIXELS", 4 * DECODE_TARGET_SIDE ** 2))
+
+# Fatores de redução do decodificador JPEG do OpenCV
+REDUCED_FLAGS = {
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+}
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+JPEG_SIGNATURE = b"\xff\xd8"
+# Marcadores SOF (início de frame) que trazem as dimensões; C4, C8 e CC não são SOF
+SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+class ImageTooLarge(ValueError):
+    """Imagem acima de UPLOAD_MAX_BYTES, IMAGE_MAX_PIXELS ou IMAGE_MAX_FULL_PIXELS."""
+
+
+def _jpeg_size(data: bytes) -> Optional[Tuple[int, int]]:
+    i = 2
+    n = len(data)
+    while i + 4 <= n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # Bytes de preenchimento entre segmentos
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # Marcadores sem comprimento
+            i += 2
+            continue
+        if marker in SOF_MARKERS:
+            if i + 9 > n:
+                return None
+            height = int.from_bytes(data[i + 5:i + 7], "big")
+            width = int.from_bytes(data[i + 7:i + 9], "big")
+            return width, height
+        i += 2 + int.from_bytes(data[i + 2:i + 4], "big")
+    return None
+
+
+def read_image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """
+    (largura, altura) lidas do cabeçalho de um JPEG ou PNG, sem decodificar.
+    Retorna None para outros formatos ou se o cabeçalho ainda não foi recebido.
+    """
+    if data.startswith(PNG_SIGNATURE):
+        if len(data) < 24:
+            return None
+        return int.from_bytes(data[16:20], "big"), int.from_bytes(data[20:24], "big")
+    if data.startswith(JPEG_SIGNATURE):
+        return _jpeg_size(data)
+    return None
+
+
+def check_image_size(size: Optional[Tuple[int, int]], max_pixels: int = IMAGE_MAX_PIXELS):
+    if size is not None and size[0] * size[1] > max_pixels:
+        raise ImageTooLarge(
+            f"Imagem muito grande: {size[0]}x{size[1]} (máximo de {max_pixels} pixels)"
+        )
+
+
+def max_pixels_for(data: bytes, max_pixels: int = IMAGE_MAX_PIXELS,
+                   max_full_pixels: int = IMAGE_MAX_FULL_PIXELS) -> int:
+    """Limite de pixels conforme o formato: só o JPEG tem decodificação reduzida."""
+    if data.startswith(JPEG_SIGNATURE):
+        return max_pixels
+    return min(max_pixels, max_full_pixels)
+
+
+def reduction_factor(size: Optional[Tuple[int, int]], target_side: int = DECODE_TARGET_SIDE) -> int:
+    """Maior fator (2, 4 ou 8) que ainda mantém o maior lado >= target_side."""
+    if size is None or target_side <= 0:
+        return 1
+    longest = max(size)
+    for factor in sorted(REDUCED_FLAGS, reverse=True):
+        if longest // factor >= target_side:
+            return factor
+    return 1
+
+
+def decode_image(data: bytes, max_bytes: int = UPLOAD_MAX_BYTES,
+                 max_pixels: int = IMAGE_MAX_PIXELS,
+                 target_side: int = DECODE_TARGET_SIDE,
+                 max_full_pixels: int = IMAGE_MAX_FULL_PIXELS) -> Tuple[Optional[np.ndarray], int]:
+    """
+    Decodifica a imagem (BGR) e retorna (frame, fator de redução). As
+    coordenadas no frame devem ser multiplicadas pelo fator para voltar à
+    imagem original. O frame é None quando os bytes não são uma imagem válida.
+    """
+    if len(data) > max_bytes:
+        raise ImageTooLarge(f"Arquivo muito grande (máximo de {max_bytes} bytes)")
+
+    size = read_image_size(data)
+    max_pixels = max_pixels_for(data, max_pixels, max_full_pixels)
+    check_image_size(size, max_pixels)
+
+    # A redução só economiza trabalho no JPEG (feita na IDCT); outros
+    # formatos seriam decodificados por inteiro e depois reduzidos
+    factor = reduction_factor(size, target_side) if data.startswith(JPEG_SIGNATURE) else 1
+    flags = REDUCED_FLAGS[factor] if factor > 1 else cv2.IMREAD_COLOR
+    frame = cv2.imdecode(np.frombuffer(data, np.uint8), flags)
+
+    if frame is not None and size is None:
+        # Formato sem leitura de cabeçalho: verifica depois de decodificar
+        check_image_size((frame.shape[1], frame.shape[0]), max_pixels)
+    return frame, factor
@@ -1,7 +1,11 @@
 import cv2
 import numpy as np
-import mediapipe as mp
-from typing import Tuple, List
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple, List
+from metrics import time_stage
+# FaceMesh criado sob demanda, um por thread (ver models.ModelRegistry)
+from models import create_face_mesh, get_face_mesh
 
 # Configurações
 LAPLACIAN_THRESHOLD = 30
@@ -9,19 +13,122 @@ BLINK_THRESHOLD = 0.3
 MOVEMENT_THRESHOLD = 0.1
 MIN_FRAMES_FOR_DETECTION = 30  # Reduzido para resposta mais rápida
 INITIALIZATION_FRAMES = 15  # Reduzido para resposta mais rápida
+MOVEMENT_HISTORY = 5  # Frames usados na média do movimento
+NUM_LANDMARKS = 478  # FaceMesh com refine_landmarks=True
 
-# Inicialização do MediaPipe
-mp_face_mesh = mp.solutions.face_mesh
-face_mesh = mp_face_mesh.FaceMesh(
-    max_num_faces=1,
-    refine_landmarks=True,
-    min_detection_confidence=0.7
-)
+# Pontos (p0..p5) de cada olho usados no EAR: |p1-p5|, |p2-p4| e |p0-p3|
+EAR_INDICES = np.array([
+    [33, 246, 161, 160, 159, 158],
+    [362, 398, 384, 385, 386, 387],
+])
+
+def eye_aspect_ratios(landmarks: np.ndarray) -> np.ndarray:
+    """EAR médio dos dois olhos para landmarks no formato (..., N, 3)."""
+    points = landmarks[..., EAR_INDICES, :]  # (..., 2 olhos, 6 pontos, 3)
+    v1 = np.linalg.norm(points[..., 1, :] - points[..., 5, :], axis=-1)
+    v2 = np.linalg.norm(points[..., 2, :] - points[..., 4, :], axis=-1)
+    h = np.linalg.norm(points[..., 0, :] - points[..., 3, :], axis=-1)
+    return ((v1 + v2) / (2.0 * h)).mean(axis=-1)
+
+class LivenessFeatureEngine:
+    """
+    Buffers pré-alocados com as features de vivacidade de várias sessões.
+
+    Cada sessão (LivenessDetector) ocupa um slot com os landmarks atuais e
+    anteriores e um buffer circular com o histórico de movimento. Os
+    landmarks de cada frame são copiados e processados no lugar, sem
+    alocar arrays por frame.
+    """
+
+    def __init__(self, capacity: int = 1, num_landmarks: int = NUM_LANDMARKS,
+                 history: int = MOVEMENT_HISTORY):
+        self.capacity = capacity
+        self.num_landmarks = num_landmarks
+        self.history = history
+        self.current = np.zeros((capacity, num_landmarks, 3))
+        self.previous = np.zeros((capacity, num_landmarks, 3))
+        # Área de trabalho da diferença entre frames, uma por slot (threads distintas)
+        self.scratch = np.zeros((capacity, num_landmarks, 3))
+        self.has_previous = np.zeros(capacity, dtype=bool)
+        self.movement_history = np.zeros((capacity, history))
+        self.history_count = np.zeros(capacity, dtype=np.int64)
+        self.history_pos = np.zeros(capacity, dtype=np.int64)
+        self._free = list(range(capacity - 1, -1, -1))
+        self._lock = threading.Lock()
+
+    def allocate(self) -> int:
+        with self._lock:
+            if not self._free:
+                raise RuntimeError("Capacidade do motor de vivacidade esgotada")
+            slot = self._free.pop()
+        self.reset(slot)
+        return slot
+
+    def release(self, slot: int):
+        self.reset(slot)
+        with self._lock:
+            self._free.append(slot)
+
+    def reset(self, slot: int):
+        self.has_previous[slot] = False
+        self.movement_history[slot] = 0.0
+        self.history_count[slot] = 0
+        self.history_pos[slot] = 0
+
+    def load(self, slot: int, face_landmarks, roi=None) -> np.ndarray:
+        """Copia os landmarks do MediaPipe para o buffer do slot e retorna a view."""
+        points = face_landmarks.landmark
+        if len(points) != self.num_landmarks:
+            raise ValueError(f"Esperados {self.num_landmarks} landmarks, recebidos {len(points)}")
+        buffer = self.current[slot]
+        x, y, z = buffer[:, 0], buffer[:, 1], buffer[:, 2]
+        for idx, lm in enumerate(points):
+            x[idx] = lm.x
+            y[idx] = lm.y
+            z[idx] = lm.z
+        if roi is not None:
+            roi.landmarks_to_frame(buffer, out=buffer)
+        return buffer
+
+    def set_reference(self, slot: int):
+        """Usa os landmarks atuais como referência, sem medir movimento."""
+        self.previous[slot] = self.current[slot]
+        self.has_previous[slot] = True
+
+    def update(self, slot: int) -> Tuple[float, float]:
+        """Calcula (EAR, movimento médio) do slot e avança a referência."""
+        current = self.current[slot]
+        previous = self.previous[slot]
+        ear = float(eye_aspect_ratios(current))
+
+        movement = 0.0
+        if self.has_previous[slot]:
+            diff = self.scratch[slot]
+            np.subtract(current, previous, out=diff)
+            np.abs(diff, out=diff)
+            pos = self.history_pos[slot]
+            self.movement_history[slot, pos] = diff.mean()
+            self.history_pos[slot] = (pos + 1) % self.history
+            count = min(self.history_count[slot] + 1, self.history)
+            self.history_count[slot] = count
+            movement = float(self.movement_history[slot].sum() / count)
+
+        previous[...] = current
+        self.has_previous[slot] = True
+        return ear, movement
+
+@dataclass
+class LivenessResult:
+    is_live: bool
+    reason: Optional[str]          # motivo da recusa (None quando is_live)
+    frame_count: int
+    confirmed: bool                # ver LivenessDetector.is_confirmed
+    metrics: Dict[str, float] = field(default_factory=dict)
 
 class LivenessDetector:
-    def __init__(self):
+    def __init__(self, engine: Optional[LivenessFeatureEngine] = None,
+                 own_face_mesh: bool = False):
         self.previous_frame = None
-        self.previous_landmarks = None
         self.frame_count = 0
         self.blink_count = 0
         self.last_blink_state = False
@@ -29,38 +136,42 @@ class LivenessDetector:
         self.debug_info = {}
         self.consecutive_failures = 0
         self.max_consecutive_failures = 5
+        # Protege o estado entre frames quando chamado de várias threads
+        self._lock = threading.Lock()
+        # Features em um motor próprio ou em um slot de um motor compartilhado
+        self.engine = engine if engine is not None else LivenessFeatureEngine()
+        self.slot = self.engine.allocate()
+        # O FaceMesh roda em modo de rastreamento: com own_face_mesh o detector
+        # tem uma instância própria (criada no primeiro frame) em vez da
+        # instância da thread, compartilhada com os frames de outros clientes
+        self.own_face_mesh = own_face_mesh
+        self._face_mesh = None
+
+    def close(self):
+        """Devolve o slot ao motor compartilhado e libera o FaceMesh próprio."""
+        if self.slot is not None:
+            self.engine.release(self.slot)
+            self.slot = None
+        if self._face_mesh is not None:
+            self._face_mesh.close()
+            self._face_mesh = None
+
+    def face_mesh(self):
+        if not self.own_face_mesh:
+            return get_face_mesh()
+        if self._face_mesh is None:
+            self._face_mesh = create_face_mesh()
+        return self._face_mesh
         
+    @property
+    def is_confirmed(self) -> bool:
+        """Vivacidade confirmada: frames suficientes, movimento e ao menos uma piscada."""
+        return (self.frame_count >= MIN_FRAMES_FOR_DETECTION and
+                self.blink_count > 0 and
+                bool(self.debug_info.get('has_movement')))
+
     def get_eye_aspect_ratio(self, landmarks) -> float:
-        LEFT_EYE = [33, 246, 161, 160, 159, 158, 157, 173, 133, 155, 154, 153, 145, 144, 163, 7]
-        RIGHT_EYE = [362, 398, 384, 385, 386, 387, 388, 466, 263, 249, 390, 373, 374, 380, 381, 382]
-        
-        def calculate_ear(eye_points):
-            v1 = np.linalg.norm(landmarks[eye_points[1]] - landmarks[eye_points[5]])
-            v2 = np.linalg.norm(landmarks[eye_points[2]] - landmarks[eye_points[4]])
-            h = np.linalg.norm(landmarks[eye_points[0]] - landmarks[eye_points[3]])
-            return (v1 + v2) / (2.0 * h)
-        
-        left_ear = calculate_ear(LEFT_EYE)
-        right_ear = calculate_ear(RIGHT_EYE)
-        return (left_ear + right_ear) / 2.0
-
-    def detect_movement(self, current_landmarks, previous_landmarks) -> float:
-        if previous_landmarks is None:
-            return 0.0
-
-        movement = np.mean(np.abs(current_landmarks - previous_landmarks))
-    
-        # Smooth movement by averaging over the last few frames
-        if not hasattr(self, 'movement_buffer'):
-            self.movement_buffer = []
-    
-        self.movement_buffer.append(movement)
-        if len(self.movement_buffer) > 5:  # Keep the last 5 movements
-            self.movement_buffer.pop(0)
-    
-        avg_movement = np.mean(self.movement_buffer)
-        self.debug_info['average_movement'] = avg_movement
-        return avg_movement
+        return float(eye_aspect_ratios(np.asarray(landmarks)))
 
     def analyze_image_quality(self, frame) -> bool:
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
@@ -92,93 +203,128 @@ class LivenessDetector:
             
         return not is_photo
 
-    def detect_liveness(self, frame) -> bool:
+    def detect_liveness(self, frame, roi=None) -> bool:
+        return self.analyze(frame, roi).is_live
+
+    def analyze(self, frame, roi=None) -> LivenessResult:
+        """
+        Processa um frame. Com ``roi`` (face_roi.FaceROI), ``frame`` deve ser o
+        recorte da face: FaceMesh e métricas de qualidade rodam só nele e os
+        landmarks são convertidos para as coordenadas do frame original.
+        """
+        with time_stage("liveness"):
+            return self._analyze(frame, roi)
+
+    def _analyze(self, frame, roi=None) -> LivenessResult:
         if frame is None or frame.size == 0:
             raise ValueError("Frame inválido fornecido")
             
         try:
             rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = face_mesh.process(rgb_frame)
+            results = self.face_mesh().process(rgb_frame)
+
+            # O FaceMesh roda fora do lock; só a atualização do estado é serializada
+            with self._lock:
+                return self._result(self._update_state(frame, results, roi))
             
-            if not results.multi_face_landmarks:
+        except Exception as e:
+            print(f"Erro na detecção de vivacidade: {str(e)}")
+            with self._lock:
                 if self.frame_count < INITIALIZATION_FRAMES:
-                    return True
-                self.consecutive_failures += 1
-                if self.consecutive_failures >= self.max_consecutive_failures:
-                    self.debug_info['reason'] = 'Nenhuma face detectada'
-                    return False
-                return True
-                
-            landmarks = np.array([[lm.x, lm.y, lm.z] for lm in results.multi_face_landmarks[0].landmark])
-            
+                    return self._result(True)
+                self.debug_info['reason'] = f'Erro: {str(e)}'
+                return self._result(False)
+
+    def _result(self, is_live: bool) -> LivenessResult:
+        # Converte escalares numpy para tipos nativos (serialização JSON)
+        metrics = {
+            key: value.item() if isinstance(value, np.generic) else value
+            for key, value in self.debug_info.items() if key != 'reason'
+        }
+        return LivenessResult(
+            is_live=is_live,
+            reason=None if is_live else self.debug_info.get('reason'),
+            frame_count=self.frame_count,
+            confirmed=self.is_confirmed,
+            metrics=metrics,
+        )
+
+    def _update_state(self, frame, results, roi=None) -> bool:
+        if not results.multi_face_landmarks:
             if self.frame_count < INITIALIZATION_FRAMES:
-                self.previous_landmarks = landmarks
-                self.frame_count += 1
                 return True
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.max_consecutive_failures:
+                self.debug_info['reason'] = 'Nenhuma face detectada'
+                return False
+            return True
             
-            # Análise de qualidade da imagem
-            if not self.analyze_image_quality(frame):
-                if self.consecutive_failures >= self.max_consecutive_failures:
-                    self.debug_info['reason'] = 'Qualidade da imagem suspeita'
-                    return False
-                return True
-                
-            # Detecção de piscadas
-            ear = self.get_eye_aspect_ratio(landmarks)
-            is_blinking = ear < BLINK_THRESHOLD
+        self.engine.load(self.slot, results.multi_face_landmarks[0], roi)
+        
+        if self.frame_count < INITIALIZATION_FRAMES:
+            self.engine.set_reference(self.slot)
+            self.frame_count += 1
+            return True
+        
+        # Análise de qualidade da imagem
+        if not self.analyze_image_quality(frame):
+            if self.consecutive_failures >= self.max_consecutive_failures:
+                self.debug_info['reason'] = 'Qualidade da imagem suspeita'
+                return False
+            return True
             
-            if is_blinking and not self.last_blink_state:
-                self.blink_count += 1
-                self.consecutive_failures = 0  # Reseta falhas após piscada
-            self.last_blink_state = is_blinking
+        # EAR e movimento (média dos últimos MOVEMENT_HISTORY frames) em uma
+        # única atualização do motor, que também avança a referência
+        ear, movement = self.engine.update(self.slot)
+        self.debug_info['average_movement'] = movement
+        
+        # Detecção de piscadas
+        is_blinking = ear < BLINK_THRESHOLD
+        
+        if is_blinking and not self.last_blink_state:
+            self.blink_count += 1
+            self.consecutive_failures = 0  # Reseta falhas após piscada
+        self.last_blink_state = is_blinking
+        
+        # Atualiza o estado
+        self.frame_count += 1
+        
+        # Verifica se houve movimento suficiente e piscadas
+        if self.frame_count >= MIN_FRAMES_FOR_DETECTION:
+            has_movement = movement > MOVEMENT_THRESHOLD
+            has_blinks = self.blink_count > 0
             
-            # Detecção de movimento
-            movement = self.detect_movement(landmarks, self.previous_landmarks)
+            # Atualiza informações de debug
+            self.debug_info.update({
+                'movement': movement,
+                'blink_count': self.blink_count,
+                'frame_count': self.frame_count,
+                'has_movement': has_movement,
+                'has_blinks': has_blinks
+            })
             
-            # Atualiza o estado
-            self.previous_landmarks = landmarks
-            self.frame_count += 1
+            if not has_movement:
+                self.consecutive_failures += 1
+                if self.consecutive_failures >= self.max_consecutive_failures:
+                    self.debug_info['reason'] = 'Movimento insuficiente'
+                    return False
+            elif not has_blinks:
+                self.consecutive_failures += 1
+                if self.consecutive_failures >= self.max_consecutive_failures:
+                    self.debug_info['reason'] = 'Nenhuma piscada detectada'
+                    return False
+            else:
+                self.consecutive_failures = 0
             
-            # Verifica se houve movimento suficiente e piscadas
-            if self.frame_count >= MIN_FRAMES_FOR_DETECTION:
-                has_movement = movement > MOVEMENT_THRESHOLD
-                has_blinks = self.blink_count > 0
-                
-                # Atualiza informações de debug
-                self.debug_info.update({
-                    'movement': movement,
-                    'blink_count': self.blink_count,
-                    'frame_count': self.frame_count,
-                    'has_movement': has_movement,
-                    'has_blinks': has_blinks
-                })
-                
-                if not has_movement:
-                    self.consecutive_failures += 1
-                    if self.consecutive_failures >= self.max_consecutive_failures:
-                        self.debug_info['reason'] = 'Movimento insuficiente'
-                        return False
-                elif not has_blinks:
-                    self.consecutive_failures += 1
-                    if self.consecutive_failures >= self.max_consecutive_failures:
-                        self.debug_info['reason'] = 'Nenhuma piscada detectada'
-                        return False
-                else:
-                    self.consecutive_failures = 0
-                
-                return True
-                
             return True
             
-        except Exception as e:
-            print(f"Erro na detecção de vivacidade: {str(e)}")
-            if self.frame_count < INITIALIZATION_FRAMES:
-                return True
-            self.debug_info['reason'] = f'Erro: {str(e)}'
-            return False
+        return True
 
 # Instância global do detector
 liveness_detector = LivenessDetector()
 
-def detect_liveness(frame):
-    return liveness_detector.detect_liveness(frame)
+def detect_liveness(frame, roi=None):
+    return liveness_detector.detect_liveness(frame, roi)
+
+def analyze_liveness(frame, roi=None) -> LivenessResult:
+    return liveness_detector.analyze(frame, roi)
@@ -1,59 +1,907 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import (
+    Depends, FastAPI, UploadFile, File, Form, Header, HTTPException, WebSocket, WebSocketDisconnect
+)
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+from dataclasses import asdict, dataclass
+from typing import List, Optional, Set, Tuple, Union
+import asyncio
+import os
+import secrets
+import threading
 import cv2
 import numpy as np
-from custom_face_detection import detect_faces
-from face_identification import identify_face, load_faces
-from liveness_detection import detect_liveness
+from custom_face_detection import DetectedFace, detect_faces
+from face_identification import (
+    FACE_MATCH_TOLERANCE, FACE_MATCH_TOP_K, GALLERY_WATCH_INTERVAL, FaceMatch, GalleryWatcher,
+    build_matches, encode_faces, enroll_face, get_gallery, load_faces, match_encodings,
+    remove_face, verify_encoding
+)
+from image_decode import (
+    UPLOAD_MAX_BYTES, ImageTooLarge, check_image_size, decode_image, max_pixels_for,
+    read_image_size
+)
+from face_roi import (
+    PIPELINE_MODE, FaceROI, detect_faces_downscaled, extract_face_roi, largest_face
+)
+from liveness_detection import (
+    LivenessDetector, LivenessFeatureEngine, LivenessResult, MIN_FRAMES_FOR_DETECTION,
+    analyze_liveness
+)
+from models import get_face_mesh, registry, warm_up
+from shared_gallery import SHARED_GALLERY_DIR, SharedGallery
+from metrics import (
+    GALLERY_SIZE, MICROBATCH_SIZE, PIPELINE_PENDING, PIPELINE_REJECTED, record_outcome,
+    render_metrics, time_stage
+)
+
+# Execução do pipeline fora do event loop
+PIPELINE_WORKERS = int(os.environ.get("PIPELINE_WORKERS", os.cpu_count() or 1))
+# Requisições aguardando um worker livre antes de responder 503
+PIPELINE_MAX_QUEUE = int(os.environ.get("PIPELINE_MAX_QUEUE", PIPELINE_WORKERS * 2))
+PIPELINE_RETRY_AFTER = 1  # segundos
+# Máximo de imagens por requisição em /authenticate/batch
+BATCH_MAX_IMAGES = int(os.environ.get("BATCH_MAX_IMAGES", 8))
+# Folga para os campos e delimitadores do multipart além das imagens
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+# Autenticação por streaming (WebSocket)
+STREAM_MAX_SESSIONS = int(os.environ.get("STREAM_MAX_SESSIONS", 32))
+STREAM_IDLE_TIMEOUT = float(os.environ.get("STREAM_IDLE_TIMEOUT", 10.0))  # segundos
+# Frames sem decisão antes de encerrar a sessão
+STREAM_MAX_FRAMES = int(os.environ.get("STREAM_MAX_FRAMES", MIN_FRAMES_FOR_DETECTION * 4))
+# Cadastro e remoção de faces pela API (POST /faces, DELETE /faces/{name}):
+# desativados por padrão e, quando ativos, exigem o cabeçalho X-Admin-Token
+FACE_ADMIN_API = os.environ.get("FACE_ADMIN_API", "0") == "1"
+FACE_ADMIN_TOKEN = os.environ.get("FACE_ADMIN_TOKEN") or None
+# Aquecimento dos modelos antes de declarar o serviço pronto (/readyz)
+MODEL_WARMUP = os.environ.get("MODEL_WARMUP", "1") != "0"
+# Agrupamento de requisições simultâneas de /authenticate/ (1 desativa)
+MICROBATCH_MAX_SIZE = int(os.environ.get("MICROBATCH_MAX_SIZE", 8))
+# Espera máxima pelo restante do lote depois da primeira requisição
+MICROBATCH_MAX_WAIT_MS = float(os.environ.get("MICROBATCH_MAX_WAIT_MS", 5.0))
+
+
+class PipelineExecutor:
+    """
+    Pool de threads com limite de concorrência e de fila. Quando a capacidade
+    (workers + fila) está esgotada a requisição é recusada imediatamente com
+    503, em vez de acumular latência.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = max(1, workers)
+        self.capacity = self.workers + max(0, max_queue)
+        self.pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="pipeline"
+        )
+
+    def reject(self):
+        PIPELINE_REJECTED.inc()
+        raise HTTPException(
+            status_code=503,
+            detail="Servidor sobrecarregado, tente novamente",
+            headers={"Retry-After": str(PIPELINE_RETRY_AFTER)},
+        )
+
+    def _release(self, _future):
+        with self._lock:
+            self.pending -= 1
+
+    async def run(self, func, *args):
+        with self._lock:
+            if self.pending >= self.capacity:
+                self.reject()
+            self.pending += 1
+
+        # A vaga só é liberada quando o trabalho termina de fato, mesmo que o
+        # cliente desconecte antes
+        future = self._executor.submit(func, *args)
+        future.add_done_callback(self._release)
+        # Inclui o tempo de espera na fila
+        with time_stage("pipeline"):
+            return await asyncio.wrap_future(future)
+
+    def run_on_each_thread(self, func, timeout: float = 300.0):
+        """
+        Executa ``func`` uma vez em cada thread do pool (para modelos que têm
+        uma instância por thread). A barreira impede que uma mesma thread
+        pegue duas tarefas.
+        """
+        barrier = threading.Barrier(self.workers, timeout=timeout)
+
+        def task():
+            barrier.wait()
+            return func()
+
+        futures = [self._executor.submit(task) for _ in range(self.workers)]
+        return [future.result() for future in futures]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class MicroBatcher:
+    """
+    Agrupa requisições simultâneas em lotes de até ``max_size`` itens. Cada
+    lote ocupa uma vaga do PipelineExecutor e ``func`` recebe a lista de itens
+    e devolve um resultado por item, na mesma ordem (uma exceção no lugar do
+    resultado falha só a requisição daquele item).
+
+    Só um lote por worker é despachado de cada vez: enquanto todos estão
+    ocupados as requisições se acumulam e o próximo lote sai maior. Com o
+    servidor ocioso (nenhum lote em execução) a requisição é despachada na
+    hora; com outros lotes em execução, um lote incompleto espera no máximo
+    ``max_wait_ms`` por mais requisições.
+    """
+
+    def __init__(self, func, executor: PipelineExecutor, max_size: int,
+                 max_wait_ms: float, max_pending: int):
+        self.func = func
+        self.executor = executor
+        self.max_size = max(1, max_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_pending = max_pending
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        self._batches: Set[asyncio.Task] = set()
+        self._in_flight = 0
+
+    @property
+    def running(self) -> bool:
+        """Iniciado pelo lifespan (sem ele, as requisições não são agrupadas)."""
+        return self._task is not None
+
+    def start(self):
+        # Criados aqui para ficarem presos ao event loop do servidor
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.executor.workers)
+        self._task = asyncio.create_task(self._collect())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Lotes já despachados terminam e respondem antes do executor ser desligado
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(HTTPException(status_code=503, detail="Servidor encerrando"))
+
+    async def submit(self, item):
+        if self._queue.qsize() >= self.max_pending:
+            self.executor.reject()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                # Sem outros lotes em execução não há carga para agrupar
+                if self._in_flight == 0 or remaining <= 0:
+                    break
+                # asyncio.wait não consome o item se o prazo vencer (ao contrário de wait_for)
+                getter = asyncio.ensure_future(self._queue.get())
+                try:
+                    done, _ = await asyncio.wait({getter}, timeout=remaining)
+                except asyncio.CancelledError:
+                    # Encerrando: devolve o lote à fila para stop() responder 503
+                    if getter.done() and not getter.cancelled():
+                        batch.append(getter.result())
+                    getter.cancel()
+                    for entry in batch:
+                        self._queue.put_nowait(entry)
+                    self._slots.release()
+                    raise
+                if not done:
+                    getter.cancel()
+                    break
+                batch.append(getter.result())
+            self._in_flight += 1
+            # O loop só guarda referência fraca às tasks
+            task = asyncio.create_task(self._dispatch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _dispatch(self, batch):
+        MICROBATCH_SIZE.observe(len(batch))
+        try:
+            results = await self.executor.run(self.func, [item for item, _ in batch])
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Recusa com 413 corpos de requisição acima do limite antes que o multipart
+    seja lido e gravado em disco: pelo Content-Length, quando informado, e
+    contando os bytes à medida que chegam (uploads com chunked encoding).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def limit_for(path: str) -> int:
+        images = BATCH_MAX_IMAGES if path.rstrip("/") == "/authenticate/batch" else 1
+        return UPLOAD_MAX_BYTES * images + UPLOAD_FORM_OVERHEAD
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.limit_for(scope["path"])
+        detail = f"Requisição muito grande (máximo de {limit} bytes)"
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            response = JSONResponse(status_code=413, content={"detail": detail})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Interrompe a leitura do formulário; vira resposta 413
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+pipeline_executor = PipelineExecutor(PIPELINE_WORKERS, PIPELINE_MAX_QUEUE)
+PIPELINE_PENDING.set_function(lambda: pipeline_executor.pending)
+GALLERY_SIZE.set_function(lambda: len(get_gallery()))
+
+
+def warm_up_pipeline() -> float:
+    """Passa um frame sintético por todas as etapas na thread atual."""
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    cv2.circle(frame, (320, 240), 100, (200, 180, 160), -1)
+    # Caixa fixa para que o codificador do dlib rode mesmo sem face detectada
+    box = (140, 420, 340, 220)
+    stages = {
+        "decode": lambda: decode_image(cv2.imencode(".jpg", frame)[1].tobytes()),
+        "detect_mediapipe": lambda: detect_faces(frame),
+        "detect_hog": lambda: encode_faces(frame),
+        "encode": lambda: encode_faces(frame, [box]),
+        "match": lambda: match_encodings(np.zeros((1, 128))),
+        # Direto no FaceMesh: o detector de vivacidade global guarda estado
+        "liveness": lambda: get_face_mesh().process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)),
+    }
+    return warm_up(stages)
+
+def warm_up_models():
+    if not MODEL_WARMUP:
+        registry.mark_warm(0.0)
+        return
+    try:
+        # Os grafos do MediaPipe são por thread: aquece cada thread do pool
+        seconds = max(pipeline_executor.run_on_each_thread(warm_up_pipeline))
+        registry.mark_warm(seconds)
+        print(f"Modelos aquecidos em {seconds:.2f} s")
+    except Exception as e:
+        print(f"Erro no aquecimento dos modelos: {str(e)}")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Inicialização
+    shared = None
     try:
-        load_faces()
+        if SHARED_GALLERY_DIR:
+            # Com vários workers, um só carrega o banco e os demais o mapeiam
+            shared = SharedGallery(SHARED_GALLERY_DIR)
+            shared.start()
+        else:
+            load_faces()
     except Exception as e:
         print(f"Erro ao carregar faces: {str(e)}")
+    warm_up_models()
+    if authentication_batcher is not None:
+        authentication_batcher.start()
+    watcher = None
+    if GALLERY_WATCH_INTERVAL > 0:
+        # Com o banco compartilhado, só o worker com o lock recarrega
+        watcher = GalleryWatcher(GALLERY_WATCH_INTERVAL,
+                                 reload=shared.reload if shared is not None else None)
+        watcher.start()
     yield
     # Finalização
-    pass
+    if watcher is not None:
+        watcher.stop()
+    if shared is not None:
+        shared.stop()
+    if authentication_batcher is not None:
+        await authentication_batcher.stop()
+    pipeline_executor.shutdown()
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(UploadSizeLimitMiddleware)
+
+
+@dataclass
+class AuthenticationResult:
+    detections: List[DetectedFace]
+    matches: List[FaceMatch]
+    liveness: LivenessResult
+    # Fator de redução da decodificação (ver image_decode.decode_image)
+    scale: int = 1
+
+    @property
+    def outcome(self) -> str:
+        if not self.liveness.is_live:
+            return "liveness_failed"
+        if not self.matches:
+            return "no_face"
+        return "match" if any(match.authenticated for match in self.matches) else "unknown"
+
+    def to_response(self) -> dict:
+        """Coordenadas na escala da imagem enviada."""
+        scale = self.scale
+        status = "Autenticado com sucesso" if self.liveness.is_live else "Fraude suspeita"
+        return {
+            "status": status,
+            "liveness": self.liveness.is_live,
+            "faces": [
+                {
+                    **asdict(face),
+                    "x": face.x * scale, "y": face.y * scale,
+                    "width": face.width * scale, "height": face.height * scale,
+                }
+                for face in self.detections
+            ],
+            "matches": [
+                {
+                    "location": tuple(v * scale for v in match.location),
+                    "identity": match.name if match.authenticated else None,
+                    "distance": match.distance,
+                    "authenticated": match.authenticated,
+                }
+                for match in self.matches
+            ],
+            "liveness_debug": asdict(self.liveness),
+        }
+
+@dataclass
+class PreparedFrame:
+    """Faces detectadas e codificadas de um frame, antes da comparação com o banco."""
+    detections: List[DetectedFace]
+    locations: List[Tuple[int, int, int, int]]   # faces codificadas, no frame original
+    encodings: List[np.ndarray]
+    liveness_frame: np.ndarray                   # frame (ou recorte) da vivacidade
+    roi: Optional[FaceROI] = None
+
+def prepare_frame(frame, encode: bool = True) -> PreparedFrame:
+    """
+    Detecção e codificação conforme PIPELINE_MODE. No modo "roi" a face é
+    localizada em um frame reduzido e só o recorte dela é processado (sem
+    face, segue como no modo "full"). Com ``encode=False`` só o necessário
+    para a vivacidade é feito. Uma falha na codificação deixa o frame sem
+    faces, como em identify_face.
+    """
+    roi = None
+    detections = []
+    if PIPELINE_MODE == "roi":
+        face = largest_face(detect_faces_downscaled(frame))
+        if face is not None:
+            roi = extract_face_roi(frame, face)
+            detections = [face]
+    elif encode:
+        # As caixas do MediaPipe são reaproveitadas e dispensam a detecção HOG
+        # do dlib; nenhuma etapa altera o frame, então não é preciso copiá-lo
+        detections = detect_faces(frame)
+
+    prepared = PreparedFrame(detections, [], [], frame if roi is None else roi.crop, roi)
+    if not encode:
+        return prepared
+    try:
+        if roi is not None:
+            locations, prepared.encodings = encode_faces(roi.crop, [roi.location])
+            # Caixas de volta às coordenadas do frame original
+            prepared.locations = [roi.face.location] * len(locations)
+        else:
+            prepared.locations, prepared.encodings = encode_faces(
+                frame, [face.location for face in detections]
+            )
+    except Exception as e:
+        print(f"Erro na identificação facial: {str(e)}")
+        prepared.locations, prepared.encodings = [], []
+    return prepared
+
+def match_prepared(prepared: List[PreparedFrame], k: int = FACE_MATCH_TOP_K) -> List[List[FaceMatch]]:
+    """
+    Compara as faces de todos os frames com o banco em uma única operação de
+    matriz e devolve as correspondências de cada frame.
+    """
+    all_candidates = match_encodings([enc for item in prepared for enc in item.encodings], k)
+
+    matches = []
+    offset = 0
+    for item in prepared:
+        candidates = all_candidates[offset:offset + len(item.encodings)]
+        offset += len(item.encodings)
+        if not item.locations:
+            print("Nenhuma face detectada no frame")
+        matches.append(build_matches(item.locations, candidates))
+    return matches
+
+def authenticate_images(images: List[bytes]) -> List[Union[AuthenticationResult, Exception]]:
+    """
+    Autentica imagens independentes (ex.: requisições agrupadas pelo
+    MicroBatcher), comparando as faces de todas com o banco em uma única
+    operação de matriz. Um erro em uma imagem (inclusive na decodificação)
+    vira o resultado só dela.
+    """
+    if len(get_gallery()) == 0:
+        raise ValueError("Nenhuma face conhecida carregada. Chame load_faces() primeiro.")
+
+    prepared = []
+    scales = []
+    for data in images:
+        try:
+            frame, scale = decode_frame(data)
+            prepared.append(prepare_frame(frame))
+            scales.append(scale)
+        except Exception as e:
+            prepared.append(e)
+            scales.append(1)
+
+    matches = iter(match_prepared([item for item in prepared if isinstance(item, PreparedFrame)]))
+    return [
+        item if isinstance(item, Exception) else AuthenticationResult(
+            item.detections, next(matches), analyze_liveness(item.liveness_frame, item.roi), scale
+        )
+        for item, scale in zip(prepared, scales)
+    ]
+
+def run_authentication(data: bytes) -> AuthenticationResult:
+    result = authenticate_images([data])[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+@dataclass
+class VerificationResult:
+    identity: str
+    face: Optional[DetectedFace]
+    distance: Optional[float]
+    liveness: LivenessResult
+    # Fator de redução da decodificação (ver image_decode.decode_image)
+    scale: int = 1
+
+    @property
+    def verified(self) -> bool:
+        return self.distance is not None and self.distance <= FACE_MATCH_TOLERANCE
+
+    @property
+    def outcome(self) -> str:
+        if not self.liveness.is_live:
+            return "liveness_failed"
+        if self.face is None:
+            return "no_face"
+        return "match" if self.verified else "unknown"
+
+    def to_response(self) -> dict:
+        scale = self.scale
+        if not self.liveness.is_live:
+            status = "Fraude suspeita"
+        elif self.face is None:
+            status = "Nenhuma face detectada"
+        else:
+            status = "Identidade confirmada" if self.verified else "Identidade não confirmada"
+        return {
+            "status": status,
+            "identity": self.identity,
+            "verified": self.verified and self.liveness.is_live,
+            "distance": self.distance,
+            "liveness": self.liveness.is_live,
+            "face": None if self.face is None else {
+                **asdict(self.face),
+                "x": self.face.x * scale, "y": self.face.y * scale,
+                "width": self.face.width * scale, "height": self.face.height * scale,
+            },
+            "liveness_debug": asdict(self.liveness),
+        }
+
+def run_verification(data: bytes, identity: str) -> VerificationResult:
+    """Verificação 1:1: compara a maior face da imagem só com os modelos de ``identity``."""
+    frame, scale = decode_frame(data)
+    if PIPELINE_MODE == "roi":
+        face = largest_face(detect_faces_downscaled(frame))
+    else:
+        face = largest_face(detect_faces(frame))
+    if face is None:
+        return VerificationResult(identity, None, None, analyze_liveness(frame), scale)
+
+    if PIPELINE_MODE == "roi":
+        roi = extract_face_roi(frame, face)
+        _, encodings = encode_faces(roi.crop, [roi.location])
+        liveness = analyze_liveness(roi.crop, roi)
+    else:
+        _, encodings = encode_faces(frame, [face.location])
+        liveness = analyze_liveness(frame)
+
+    distance = verify_encoding(encodings[0], identity) if encodings else None
+    return VerificationResult(identity, face, distance, liveness, scale)
+
+def run_batch_authentication(images: List[bytes]) -> dict:
+    if len(get_gallery()) == 0:
+        raise ValueError("Nenhuma face conhecida carregada. Chame load_faces() primeiro.")
+
+    # Decodificação também no pool: fora do event loop e dentro do limite de vagas
+    frames = [decode_frame(data)[0] for data in images]
+
+    # Detecção e codificação por imagem; a comparação com o banco é feita
+    # depois, para todas as faces do lote em uma única operação de matriz
+    prepared = [prepare_frame(frame) for frame in frames]
+    matches_per_frame = match_prepared(prepared, k=1)
+
+    results = []
+    for item, matches in zip(prepared, matches_per_frame):
+        n_faces = len(matches)
+        best = min((m for m in matches if m.distance is not None),
+                   key=lambda m: m.distance, default=None)
+        matched = best is not None and best.authenticated
+        liveness = analyze_liveness(item.liveness_frame, item.roi)
+        results.append({
+            "faces": n_faces,
+            "identity": best.name if matched else None,
+            "distance": best.distance if best is not None else None,
+            "liveness": liveness.is_live,
+        })
+
+        if not liveness.is_live:
+            record_outcome("batch", "liveness_failed", liveness.reason)
+        elif n_faces == 0:
+            record_outcome("batch", "no_face")
+        else:
+            record_outcome("batch", "match" if matched else "unknown")
+
+    # Resultado agregado: maioria dos frames com a mesma identidade e
+    # vivacidade confirmada em todos
+    votes = Counter(r["identity"] for r in results if r["identity"] is not None)
+    identity, matched_frames = votes.most_common(1)[0] if votes else (None, 0)
+    liveness = all(r["liveness"] for r in results)
+
+    if not liveness:
+        status = "Fraude suspeita"
+    elif matched_frames * 2 > len(results):
+        status = "Autenticado com sucesso"
+    else:
+        status = "Rosto não reconhecido"
+        identity = None
+
+    return {
+        "status": status,
+        "liveness": liveness,
+        "identity": identity if liveness else None,
+        "matched_frames": matched_frames,
+        "frames": results,
+    }
+
+class StreamSession:
+    """
+    Estado de uma conexão de streaming: detector de vivacidade (com FaceMesh
+    próprio, para o rastreamento não misturar frames de clientes diferentes)
+    e identidade. Os frames de uma sessão são processados um de cada vez.
+    """
+
+    def __init__(self):
+        self.liveness_detector = LivenessDetector(stream_liveness_engine, own_face_mesh=True)
+        self.identity = None
+        self.distance = None
+        self.frames = 0
+
+    def process_frame(self, data: bytes):
+        """
+        Decodifica e processa um frame e retorna o resultado final, ou None se
+        ainda não há decisão. Bytes inválidos geram HTTPException.
+        """
+        frame, _ = decode_frame(data)
+        self.frames += 1
+
+        # A identificação só roda até a primeira correspondência; depois
+        # disso o frame só é preparado para a vivacidade
+        prepared = prepare_frame(frame, encode=self.identity is None)
+        if self.identity is None:
+            for match in match_prepared([prepared], k=1)[0]:
+                if match.authenticated:
+                    self.identity, self.distance = match.name, match.distance
+                    break
+
+        liveness = self.liveness_detector.analyze(prepared.liveness_frame, prepared.roi)
+        if not liveness.is_live:
+            record_outcome("stream", "liveness_failed", liveness.reason)
+            return self.result("Fraude suspeita", False, liveness.reason)
+
+        if liveness.confirmed:
+            if self.identity is None:
+                record_outcome("stream", "unknown")
+                return self.result("Rosto não reconhecido", True)
+            record_outcome("stream", "match")
+            return self.result("Autenticado com sucesso", True)
+
+        if self.frames >= STREAM_MAX_FRAMES:
+            reason = "Limite de frames atingido"
+            record_outcome("stream", "liveness_failed", reason)
+            return self.result("Vivacidade não confirmada", False, reason)
+        return None
+
+    def close(self):
+        self.liveness_detector.close()
+
+    def result(self, status: str, liveness: bool, reason=None) -> dict:
+        authenticated = liveness and self.identity is not None
+        return {
+            "status": status,
+            "liveness": liveness,
+            "identity": self.identity if authenticated else None,
+            "distance": self.distance if authenticated else None,
+            "frames": self.frames,
+            "reason": reason,
+        }
+
+authentication_batcher = (
+    MicroBatcher(
+        authenticate_images, pipeline_executor, MICROBATCH_MAX_SIZE,
+        MICROBATCH_MAX_WAIT_MS, max_pending=pipeline_executor.capacity * MICROBATCH_MAX_SIZE,
+    )
+    if MICROBATCH_MAX_SIZE > 1 else None
+)
+
+active_stream_sessions = 0
+# Buffers de vivacidade pré-alocados para todas as sessões de streaming
+stream_liveness_engine = LivenessFeatureEngine(capacity=STREAM_MAX_SESSIONS)
+
+async def read_upload(file: UploadFile) -> bytes:
+    """
+    Lê o upload já recebido (o corpo da requisição é limitado antes, por
+    UploadSizeLimitMiddleware). Recusa com 413 arquivos acima de
+    UPLOAD_MAX_BYTES (ex.: um dos arquivos de /authenticate/batch) e imagens
+    cujo cabeçalho indica mais pixels que o permitido para o formato (ver
+    image_decode.max_pixels_for). A decodificação fica para o pool de threads.
+    """
+    if not file.content_type or not file.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="O arquivo deve ser uma imagem")
+
+    if file.size is not None and file.size > UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Arquivo muito grande (máximo de {UPLOAD_MAX_BYTES} bytes)")
+
+    contents = await file.read()
+    if not contents:
+        raise HTTPException(status_code=400, detail="Arquivo vazio")
+    try:
+        check_image_size(read_image_size(contents), max_pixels_for(contents))
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    return contents
+
+def decode_frame(data: bytes):
+    """Decodifica (em escala reduzida quando possível) e retorna (frame, fator)."""
+    try:
+        with time_stage("decode"):
+            frame, scale = decode_image(data)
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    if frame is None:
+        raise HTTPException(status_code=400, detail="Formato de imagem inválido")
+    return frame, scale
 
 @app.post("/authenticate/")
 async def authenticate(file: UploadFile = File(...)):
-    if not file.content_type.startswith('image/'):
-        raise HTTPException(status_code=400, detail="O arquivo deve ser uma imagem")
-    
-    try:
-        contents = await file.read()
-        if not contents:
-            raise HTTPException(status_code=400, detail="Arquivo vazio")
-            
-        nparr = np.frombuffer(contents, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if frame is None:
-            raise HTTPException(status_code=400, detail="Formato de imagem inválido")
-            
-        # Armazena o frame original para detecção de vivacidade
-        original_frame = frame.copy()
-        
-        # Processa o frame para detecção e identificação facial
-        frame = detect_faces(frame)
-        frame = identify_face(frame)
-        
-        # Usa o frame original para detecção de vivacidade
-        if not detect_liveness(original_frame):
-            return {"status": "Fraude suspeita", "liveness": False}
-        
-        return {"status": "Autenticado com sucesso", "liveness": True}
-        
+    try:
+        data = await read_upload(file)
+
+        # Decodificação, detecção, identificação e vivacidade rodam no pool de
+        # threads, agrupadas com outras requisições simultâneas quando possível
+        if authentication_batcher is not None and authentication_batcher.running:
+            result = await authentication_batcher.submit(data)
+        else:
+            result = await pipeline_executor.run(run_authentication, data)
+        record_outcome("authenticate", result.outcome, result.liveness.reason)
+        return result.to_response()
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/authenticate/batch")
+async def authenticate_batch(files: List[UploadFile] = File(...)):
+    if len(files) > BATCH_MAX_IMAGES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Máximo de {BATCH_MAX_IMAGES} imagens por requisição"
+        )
+
+    try:
+        images = [await read_upload(file) for file in files]
+
+        # O lote inteiro (com a decodificação) ocupa uma única vaga do pool
+        return await pipeline_executor.run(run_batch_authentication, images)
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@app.websocket("/ws/authenticate")
+async def authenticate_stream(websocket: WebSocket):
+    """
+    Recebe frames (bytes JPEG/PNG) por uma única conexão e envia o resultado
+    assim que a decisão é tomada. Cada conexão tem seu próprio detector de
+    vivacidade.
+    """
+    global active_stream_sessions
+
+    await websocket.accept()
+    if active_stream_sessions >= STREAM_MAX_SESSIONS:
+        # 1013: "Try Again Later"
+        await websocket.close(code=1013, reason="Limite de sessões atingido")
+        return
+
+    active_stream_sessions += 1
+    session = StreamSession()
+    try:
+        if len(get_gallery()) == 0:
+            await websocket.send_json({"status": "Erro", "reason": "Nenhuma face conhecida carregada"})
+            await websocket.close(code=1011)
+            return
+
+        while True:
+            try:
+                data = await asyncio.wait_for(websocket.receive_bytes(), STREAM_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                record_outcome("stream", "timeout")
+                await websocket.send_json(session.result("Tempo esgotado", False, "Sessão ociosa"))
+                await websocket.close(code=1000)
+                return
+
+            try:
+                result = await pipeline_executor.run(session.process_frame, data)
+            except HTTPException as e:
+                # Imagem inválida ou pool saturado: o frame é descartado e o
+                # cliente continua enviando
+                await websocket.send_json({"status": "Erro", "reason": e.detail})
+                continue
+
+            if result is not None:
+                await websocket.send_json(result)
+                await websocket.close(code=1000)
+                return
+
+    except WebSocketDisconnect:
+        pass
     finally:
-        # Limpa os recursos
-        if 'frame' in locals():
-            del frame
-        if 'original_frame' in locals():
-            del original_frame
+        session.close()
+        active_stream_sessions -= 1
+
+@app.post("/verify/{identity}")
+async def verify(identity: str, file: UploadFile = File(...)):
+    """Confirma se a face enviada é de ``identity`` (1:1, sem busca no banco inteiro)."""
+    if get_gallery().template_count(identity) == 0:
+        raise HTTPException(status_code=404, detail="Identidade não cadastrada")
+
+    try:
+        data = await read_upload(file)
+
+        result = await pipeline_executor.run(run_verification, data, identity)
+        record_outcome("verify", result.outcome, result.liveness.reason)
+        return result.to_response()
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """
+    Protege as rotas que alteram o banco de faces: sem FACE_ADMIN_API elas não
+    existem para o cliente (404) e, com ela, exigem o token de administração.
+    """
+    if not FACE_ADMIN_API:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if FACE_ADMIN_TOKEN is None:
+        raise HTTPException(status_code=503, detail="FACE_ADMIN_TOKEN não configurado")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, FACE_ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Token de administração inválido")
+
+@app.post("/faces", dependencies=[Depends(require_admin)])
+async def add_face(name: str = Form(...), file: UploadFile = File(...),
+                   replace: bool = Form(...)):
+    """
+    Cadastra uma face sem reiniciar o serviço. ``replace`` é obrigatório:
+    ``true`` substitui todos os modelos da pessoa e ``false`` adiciona a
+    imagem como mais um modelo.
+    """
+    try:
+        # A imagem é gravada no banco como foi enviada, sem redução
+        contents = await read_upload(file)
+
+        # A codificação (HOG + dlib) roda no pool como as autenticações
+        new_gallery = await pipeline_executor.run(enroll_face, name, contents, replace)
+        return {
+            "status": "Face cadastrada",
+            "name": name,
+            "templates": new_gallery.template_count(name),
+            "gallery_size": len(new_gallery),
+        }
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/faces/{name}", dependencies=[Depends(require_admin)])
+async def delete_face(name: str):
+    try:
+        # No mesmo pool dos cadastros, com o mesmo limite de fila
+        removed = await pipeline_executor.run(remove_face, name)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if not removed:
+        raise HTTPException(status_code=404, detail="Face não encontrada")
+    return {"status": "Face removida", "name": name, "gallery_size": len(get_gallery())}
+
+@app.get("/healthz")
+def healthz():
+    """O processo está de pé (não indica que pode receber tráfego)."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    """Pronto somente com o banco de faces carregado e os modelos aquecidos."""
+    gallery_size = len(get_gallery())
+    ready = registry.warm and gallery_size > 0
+    content = {"ready": ready, "gallery_size": gallery_size, **registry.status()}
+    if not ready:
+        return JSONResponse(status_code=503, content=content)
+    return content
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Métricas no formato de texto do Prometheus."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
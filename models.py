@@ -0,0 +1,123 @@
+import importlib
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+class ModelRegistry:
+    """
+    Registro central dos modelos (MediaPipe, dlib). Nada é importado nem
+    construído até o primeiro ``get``: importar os módulos do projeto não
+    inicializa grafos nem carrega pesos.
+
+    Modelos ``per_thread`` têm uma instância por thread (os grafos do
+    MediaPipe não podem ser usados por várias threads ao mesmo tempo); os
+    demais são criados uma única vez e compartilhados.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._per_thread: Dict[str, bool] = {}
+        self._shared: Dict[str, Any] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._count_lock = threading.Lock()
+        # Instâncias criadas por modelo (em todas as threads)
+        self.instances: Dict[str, int] = {}
+        self.warm = False
+        self.warmup_seconds: Optional[float] = None
+
+    def register(self, name: str, factory: Callable[[], Any], per_thread: bool = False):
+        self._factories[name] = factory
+        self._per_thread[name] = per_thread
+
+    def get(self, name: str) -> Any:
+        if self._per_thread[name]:
+            instances = self._local.__dict__
+            if name not in instances:
+                instances[name] = self._create(name)
+            return instances[name]
+
+        model = self._shared.get(name)
+        if model is None:
+            with self._lock:
+                model = self._shared.get(name)
+                if model is None:
+                    model = self._shared[name] = self._create(name)
+        return model
+
+    def create(self, name: str) -> Any:
+        """Instância nova e exclusiva de quem chama, fora do cache do registro."""
+        return self._create(name)
+
+    def _create(self, name: str) -> Any:
+        model = self._factories[name]()
+        with self._count_lock:
+            self.instances[name] = self.instances.get(name, 0) + 1
+        return model
+
+    def mark_warm(self, seconds: float):
+        self.warm = True
+        self.warmup_seconds = seconds
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "warm": self.warm,
+            "warmup_seconds": self.warmup_seconds,
+            "instances": dict(self.instances),
+        }
+
+
+def _face_detection():
+    mp = importlib.import_module("mediapipe")
+    return mp.solutions.face_detection.FaceDetection(
+        min_detection_confidence=0.7,  # Aumentado para maior precisão
+        model_selection=0  # 0 para rostos próximos
+    )
+
+
+def _face_mesh():
+    mp = importlib.import_module("mediapipe")
+    return mp.solutions.face_mesh.FaceMesh(
+        max_num_faces=1,
+        refine_landmarks=True,
+        min_detection_confidence=0.7
+    )
+
+
+registry = ModelRegistry()
+registry.register("face_detection", _face_detection, per_thread=True)
+registry.register("face_mesh", _face_mesh, per_thread=True)
+# face_recognition carrega os modelos do dlib ao ser importado
+registry.register("face_recognition", lambda: importlib.import_module("face_recognition"))
+
+
+def get_face_detector():
+    return registry.get("face_detection")
+
+
+def get_face_mesh():
+    return registry.get("face_mesh")
+
+
+def create_face_mesh():
+    """FaceMesh próprio (ex.: uma sessão de streaming); feche com close()."""
+    return registry.create("face_mesh")
+
+
+def get_face_recognition():
+    return registry.get("face_recognition")
+
+
+def warm_up(stages: Dict[str, Callable[[], Any]]) -> float:
+    """
+    Executa cada etapa uma vez (na thread atual) para inicializar os grafos e
+    as primeiras chamadas do dlib. Retorna o tempo total em segundos.
+    """
+    start = time.perf_counter()
+    for name, stage in stages.items():
+        try:
+            stage()
+        except Exception as e:
+            raise RuntimeError(f"Falha no aquecimento da etapa {name}: {str(e)}") from e
+    return time.perf_counter() - start
@@ -0,0 +1,126 @@
+import numpy as np
+from typing import Optional, Sequence
+
+# Formatos de armazenamento das codificações do banco
+STORAGE_TYPES = ("float32", "float16", "int8")
+# Linhas convertidas para float32 por vez no cálculo das distâncias
+DOT_CHUNK_SIZE = 4096
+
+
+class QuantizedVectors:
+    """
+    Vetores (N x D) armazenados em float32, float16 ou int8 com uma escala
+    float32 por vetor (x ≈ código * escala).
+
+    As consultas continuam em float32: só o lado do banco é quantizado, e o
+    produto interno é calculado em blocos convertidos para float32, sem
+    materializar a matriz inteira descompactada.
+    """
+
+    def __init__(self, codes: np.ndarray, scales: Optional[np.ndarray] = None):
+        if codes.ndim != 2:
+            raise ValueError(f"Formato inválido: {codes.shape}")
+        if codes.dtype == np.int8 and scales is None:
+            raise ValueError("Códigos int8 precisam das escalas por vetor")
+        self.codes = codes
+        self.scales = None if scales is None else np.asarray(scales, dtype=np.float32)
+        # Normas ao quadrado dos vetores reconstruídos (o que a busca enxerga)
+        self.sq_norms = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), DOT_CHUNK_SIZE):
+            block = self.decode(slice(start, start + DOT_CHUNK_SIZE))
+            self.sq_norms[start:start + len(block)] = np.einsum("ij,ij->i", block, block)
+
+    @staticmethod
+    def _quantize(vectors, storage: str):
+        """(códigos, escalas ou None) de uma matriz de vetores."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if storage == "float32":
+            return np.ascontiguousarray(vectors), None
+        if storage == "float16":
+            return vectors.astype(np.float16), None
+        if storage == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+            return codes, scales
+        raise ValueError(f"Armazenamento desconhecido: {storage} (use {', '.join(STORAGE_TYPES)})")
+
+    @classmethod
+    def encode(cls, vectors, storage: str = "float32") -> "QuantizedVectors":
+        return cls(*cls._quantize(vectors, storage))
+
+    @classmethod
+    def encode_rows(cls, rows: Sequence[np.ndarray], dim: int, storage: str = "float32",
+                    chunk_size: int = DOT_CHUNK_SIZE) -> "QuantizedVectors":
+        """
+        Como encode, a partir de uma sequência de vetores (ex.: linhas de uma
+        matriz mapeada em memória): cada bloco de ``chunk_size`` linhas é
+        convertido direto para o formato final, sem montar a matriz inteira
+        em ponto flutuante.
+        """
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Armazenamento desconhecido: {storage} (use {', '.join(STORAGE_TYPES)})")
+        codes = np.empty((len(rows), dim), dtype=np.dtype(storage))
+        scales = np.empty(len(rows), dtype=np.float32) if storage == "int8" else None
+        for start in range(0, len(rows), chunk_size):
+            block_codes, block_scales = cls._quantize(np.stack(rows[start:start + chunk_size]), storage)
+            codes[start:start + len(block_codes)] = block_codes
+            if scales is not None:
+                scales[start:start + len(block_codes)] = block_scales
+        return cls(codes, scales)
+
+    @classmethod
+    def concatenate(cls, parts: Sequence["QuantizedVectors"]) -> "QuantizedVectors":
+        codes = np.concatenate([part.codes for part in parts])
+        if parts[0].scales is None:
+            return cls(codes)
+        return cls(codes, np.concatenate([part.scales for part in parts]))
+
+    @property
+    def storage(self) -> str:
+        return "int8" if self.scales is not None else self.codes.dtype.name
+
+    @property
+    def dim(self) -> int:
+        return self.codes.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (0 if self.scales is None else self.scales.nbytes)
+
+    def __len__(self) -> int:
+        return self.codes.shape[0]
+
+    def take(self, rows) -> "QuantizedVectors":
+        """Subconjunto das linhas, sem requantizar."""
+        return QuantizedVectors(
+            np.ascontiguousarray(self.codes[rows]),
+            None if self.scales is None else self.scales[rows],
+        )
+
+    def decode(self, rows=slice(None)) -> np.ndarray:
+        """Linhas reconstruídas em float32."""
+        block = self.codes[rows]
+        if self.scales is not None:
+            return block.astype(np.float32) * self.scales[rows][:, None]
+        return np.asarray(block, dtype=np.float32)
+
+    def dot(self, queries: np.ndarray) -> np.ndarray:
+        """Produto interno consultas (F x D) x banco (N x D) -> F x N."""
+        if self.codes.dtype == np.float32:
+            return queries @ self.codes.T
+        out = np.empty((queries.shape[0], len(self)), dtype=np.float32)
+        for start in range(0, len(self), DOT_CHUNK_SIZE):
+            block = self.codes[start:start + DOT_CHUNK_SIZE].astype(np.float32)
+            product = queries @ block.T
+            if self.scales is not None:
+                product *= self.scales[start:start + DOT_CHUNK_SIZE][None, :]
+            out[:, start:start + block.shape[0]] = product
+        return out
+
+    def sq_distances(self, queries: np.ndarray) -> np.ndarray:
+        """Distâncias euclidianas ao quadrado (F x N): ||q||² + ||g||² - 2 q·g."""
+        sq = np.einsum("ij,ij->i", queries, queries)[:, None] + self.sq_norms[None, :]
+        sq -= 2.0 * self.dot(queries)
+        np.maximum(sq, 0.0, out=sq)
+        return sq
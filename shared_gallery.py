@@ -0,0 +1,336 @@
+import json
+import os
+import threading
+import time
+import numpy as np
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+import face_identification
+from face_gallery import ENCODING_DIM, FaceGallery
+from quantization import QuantizedVectors
+
+# Diretório dos segmentos compartilhados entre os workers (None desativa)
+SHARED_GALLERY_DIR = os.environ.get("SHARED_GALLERY_DIR") or None
+# Intervalo com que cada worker procura uma versão nova (segundos)
+SHARED_GALLERY_POLL_INTERVAL = float(os.environ.get("SHARED_GALLERY_POLL_INTERVAL", 1.0))
+# Tempo após o qual um lock abandonado (worker que morreu) é descartado
+SHARED_GALLERY_LOCK_TIMEOUT = float(os.environ.get("SHARED_GALLERY_LOCK_TIMEOUT", 600.0))
+
+CURRENT_FILE = "current.json"
+LOCK_FILE = "publish.lock"
+
+
+class FileLock:
+    """
+    Lock entre processos baseado na criação exclusiva de um arquivo
+    (O_CREAT | O_EXCL), que funciona igual no Linux e no Windows.
+
+    Enquanto o lock está adquirido, uma thread atualiza o mtime do arquivo a
+    cada ``stale_after / 4`` segundos: só um lock de um processo que morreu
+    fica sem atualização por ``stale_after`` e é descartado, mesmo que uma
+    carga longa do banco demore mais que isso.
+    """
+
+    def __init__(self, path: str, stale_after: float = SHARED_GALLERY_LOCK_TIMEOUT):
+        self.path = path
+        self.stale_after = stale_after
+        self._fd: Optional[int] = None
+        self._released: Optional[threading.Event] = None
+        self._heartbeat: Optional[threading.Thread] = None
+
+    def _break_stale(self):
+        try:
+            if time.time() - os.path.getmtime(self.path) > self.stale_after:
+                print(f"Aviso: Removendo lock abandonado {self.path}")
+                os.remove(self.path)
+        except OSError:
+            pass
+
+    def acquire(self, blocking: bool = True, timeout: Optional[float] = None,
+                poll: float = 0.1) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                self._fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(self._fd, str(os.getpid()).encode())
+                self._start_heartbeat()
+                return True
+            except FileExistsError:
+                self._break_stale()
+            if not blocking or (deadline is not None and time.monotonic() >= deadline):
+                return False
+            time.sleep(poll)
+
+    def _start_heartbeat(self):
+        self._released = threading.Event()
+        self._heartbeat = threading.Thread(
+            target=self._touch, args=(self._released,), name="shared-gallery-lock", daemon=True
+        )
+        self._heartbeat.start()
+
+    def _touch(self, released: threading.Event):
+        while not released.wait(self.stale_after / 4):
+            try:
+                os.utime(self.path)
+            except OSError:
+                pass
+
+    def release(self):
+        if self._fd is None:
+            return
+        self._released.set()
+        self._heartbeat.join()
+        self._heartbeat = None
+        os.close(self._fd)
+        self._fd = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def wait_released(self, timeout: Optional[float] = None, poll: float = 0.1) -> bool:
+        """Espera outro processo liberar o lock, sem adquiri-lo."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while os.path.exists(self.path):
+            self._break_stale()
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(poll)
+        return True
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class SharedGallery:
+    """
+    Banco de faces compartilhado entre os workers do uvicorn.
+
+    Cada versão publicada é um segmento imutável: ``gallery-<versão>.npy``
+    (matriz float32 lida com memory-map, as páginas ficam no cache do sistema
+    operacional e são compartilhadas por todos os processos) e
+    ``gallery-<versão>.json`` com os nomes, o formato dos códigos e o estado
+    do diretório do banco que a versão representa. ``current.json`` aponta para a
+    versão vigente e é trocado com os.replace; os workers verificam esse
+    arquivo periodicamente e carregam a versão nova sem reiniciar.
+    """
+
+    def __init__(self, directory: str, poll_interval: float = SHARED_GALLERY_POLL_INTERVAL):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.lock = FileLock(os.path.join(directory, LOCK_FILE))
+        self.version = 0
+        # Thread que está dentro de update_guard ou reload (já com o lock entre processos)
+        self._guard_owner: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def current_path(self) -> str:
+        return os.path.join(self.directory, CURRENT_FILE)
+
+    def _segment_paths(self, version: int) -> Tuple[str, str, str]:
+        """(códigos, escalas dos códigos int8, metadados) da versão."""
+        base = os.path.join(self.directory, f"gallery-{version}")
+        return base + ".npy", base + ".scales.npy", base + ".json"
+
+    def read_current(self) -> int:
+        try:
+            with open(self.current_path, "r", encoding="utf-8") as f:
+                return int(json.load(f)["version"])
+        except (OSError, ValueError, KeyError):
+            return 0
+
+    def _read_metadata(self, version: int) -> dict:
+        with open(self._segment_paths(version)[2], "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        metadata["snapshot"] = {
+            path: tuple(value) for path, value in metadata.get("snapshot", {}).items()
+        }
+        return metadata
+
+    def _is_up_to_date(self) -> bool:
+        """A versão vigente representa o diretório atual no FACE_GALLERY_STORAGE configurado."""
+        version = self.read_current()
+        if version <= 0:
+            return False
+        try:
+            metadata = self._read_metadata(version)
+        except (OSError, ValueError, KeyError):
+            return False
+        # Trocar FACE_GALLERY_STORAGE exige um segmento novo no formato pedido
+        if metadata.get("storage") != face_identification.FACE_GALLERY_STORAGE:
+            return False
+        return metadata["snapshot"] == face_identification.directory_snapshot()
+
+    def start(self):
+        """
+        Um único worker (o que obtiver o lock) carrega o banco e publica o
+        segmento, se o diretório mudou desde a última versão publicada; os
+        demais esperam e apenas mapeiam a versão vigente.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        if self.lock.acquire(blocking=False):
+            try:
+                if not self._is_up_to_date():
+                    face_identification.load_faces()
+                    gallery = face_identification.get_gallery()
+                    version = self._write_segment(gallery, face_identification.loaded_snapshot())
+                    self.attach(version, index=gallery.index)
+            except Exception as e:
+                # Segue com a última versão publicada, se houver
+                print(f"Erro ao publicar o banco compartilhado: {str(e)}")
+            finally:
+                self.lock.release()
+        else:
+            self.lock.wait_released()
+        self.attach(self.read_current())
+
+        face_identification.gallery_publishers.append(self.publish)
+        face_identification.gallery_update_guards.append(self.update_guard)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._poll, name="shared-gallery", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        if self.publish in face_identification.gallery_publishers:
+            face_identification.gallery_publishers.remove(self.publish)
+        if self.update_guard in face_identification.gallery_update_guards:
+            face_identification.gallery_update_guards.remove(self.update_guard)
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @contextmanager
+    def update_guard(self):
+        """
+        Mantém o lock entre processos durante um cadastro ou remoção e carrega
+        antes a versão vigente: o banco novo parte dos cadastros de todos os
+        workers, mesmo os publicados depois da última verificação periódica.
+        """
+        with self.lock:
+            self._guard_owner = threading.get_ident()
+            try:
+                self.attach(self.read_current())
+                yield
+            finally:
+                self._guard_owner = None
+
+    def reload(self):
+        """
+        Recarga do GalleryWatcher: só o worker que obtiver o lock recarrega o
+        diretório e publica a versão nova, que os demais recebem pelo _poll.
+        Se outro worker já estiver recarregando (ou cadastrando), ou se a
+        versão vigente já representa o diretório, não faz nada.
+        """
+        if not self.lock.acquire(blocking=False):
+            return
+        self._guard_owner = threading.get_ident()
+        try:
+            self.attach(self.read_current())
+            if not self._is_up_to_date():
+                face_identification.load_faces()
+        finally:
+            self._guard_owner = None
+            self.lock.release()
+
+    def publish(self, gallery: FaceGallery):
+        """Publica um banco construído neste worker para todos os outros."""
+        if self._guard_owner == threading.get_ident():
+            # Chamado de dentro de update_guard, que já tem o lock
+            version = self._write_segment(gallery, face_identification.loaded_snapshot())
+        else:
+            with self.lock:
+                version = self._write_segment(gallery, face_identification.loaded_snapshot())
+        # Troca a cópia privada pelo segmento mapeado, reaproveitando o índice
+        self.attach(version, index=gallery.index)
+
+    def _write_segment(self, gallery: FaceGallery, snapshot: Dict[str, Tuple[int, int]]) -> int:
+        # Chamado com o lock adquirido
+        version = self.read_current() + 1
+        matrix_path, scales_path, names_path = self._segment_paths(version)
+
+        # Os códigos são gravados no formato do banco (float32, float16 ou int8)
+        with open(matrix_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(gallery.vectors.codes))
+        if gallery.vectors.scales is not None:
+            with open(scales_path, "wb") as f:
+                np.save(f, gallery.vectors.scales)
+        with open(names_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "names": gallery.names,
+                "snapshot": snapshot,
+                "storage": gallery.vectors.storage,
+            }, f)
+
+        tmp_path = self.current_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": version}, f)
+        os.replace(tmp_path, self.current_path)
+
+        self._remove_old_segments(keep={version, version - 1})
+        return version
+
+    def _remove_old_segments(self, keep):
+        # A versão anterior é mantida para os workers que ainda não trocaram
+        for name in os.listdir(self.directory):
+            if not name.startswith("gallery-"):
+                continue
+            try:
+                version = int(name[len("gallery-"):].split(".")[0])
+            except ValueError:
+                continue
+            if version in keep:
+                continue
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                # Ainda mapeado por algum processo (Windows); removido na próxima publicação
+                pass
+
+    def attach(self, version: int, index=None) -> bool:
+        """Mapeia a versão ``version`` e a publica neste worker."""
+        # Versões só crescem; ignora leituras atrasadas do current.json
+        if version <= self.version:
+            return False
+
+        matrix_path, scales_path, _ = self._segment_paths(version)
+        try:
+            matrix = np.load(matrix_path, mmap_mode="r")
+            scales = np.load(scales_path) if os.path.exists(scales_path) else None
+            metadata = self._read_metadata(version)
+            names = metadata["names"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Aviso: Não foi possível carregar o banco compartilhado v{version}: {str(e)}")
+            return False
+        if matrix.ndim != 2 or matrix.shape[1] != ENCODING_DIM:
+            print(f"Aviso: Banco compartilhado v{version} com formato inválido: {matrix.shape}")
+            return False
+
+        # Os códigos continuam mapeados, sem conversão, em qualquer formato
+        vectors = QuantizedVectors(matrix, scales)
+        if index is not None:
+            new_gallery = FaceGallery(vectors, names)
+            new_gallery.index = index
+        else:
+            new_gallery = face_identification.build_gallery(vectors, names)
+
+        # notify=False: a versão já está publicada, não deve gerar outra
+        face_identification.set_gallery(new_gallery, metadata["snapshot"], notify=False)
+        self.version = version
+        print(f"Banco compartilhado v{version} carregado ({len(new_gallery)} faces)")
+        return True
+
+    def _poll(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                version = self.read_current()
+                if version > self.version:
+                    self.attach(version)
+            except Exception as e:
+                print(f"Erro ao verificar o banco compartilhado: {str(e)}")
@@ -0,0 +1,168 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class LatestSlot:
+    """
+    Posição única compartilhada entre threads: cada put substitui o item
+    anterior (o mais recente vence). Consumidores informam a última versão
+    vista e esperam por uma mais nova; itens intermediários são descartados.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self.version = 0
+
+    def put(self, item):
+        with self._cond:
+            self._item = item
+            self.version += 1
+            self._cond.notify_all()
+
+    def get(self, last_version: int = 0, timeout: Optional[float] = None) -> Tuple[int, Any]:
+        """Retorna (versão, item), ou (last_version, None) se nada novo chegar no prazo."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.version > last_version, timeout):
+                return last_version, None
+            return self.version, self._item
+
+
+class RateMeter:
+    """Eventos por segundo em uma janela deslizante."""
+
+    def __init__(self, window: float = 1.0):
+        self.window = window
+        self._times = deque()
+        self._lock = threading.Lock()
+
+    def tick(self):
+        now = time.monotonic()
+        with self._lock:
+            self._times.append(now)
+            while self._times and now - self._times[0] > self.window:
+                self._times.popleft()
+
+    @property
+    def rate(self) -> float:
+        now = time.monotonic()
+        with self._lock:
+            recent = [t for t in self._times if now - t <= self.window]
+        return len(recent) / self.window
+
+
+class StageTimer:
+    """Latência por etapa do processamento (média móvel exponencial, em ms)."""
+
+    def __init__(self, smoothing: float = 0.2):
+        self.smoothing = smoothing
+        self._latencies: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000.0)
+
+    def record(self, name: str, elapsed_ms: float):
+        with self._lock:
+            previous = self._latencies.get(name)
+            if previous is None:
+                self._latencies[name] = elapsed_ms
+            else:
+                self._latencies[name] = previous + self.smoothing * (elapsed_ms - previous)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._latencies)
+
+
+class CameraPipeline:
+    """
+    Pipeline produtor/consumidor para a câmera: uma thread de captura publica
+    o frame mais recente em ``frames`` e uma thread de processamento consome
+    sempre o último frame disponível (frames antigos são descartados),
+    publicando o resultado em ``results``. A interface lê os dois slots de
+    forma independente.
+    """
+
+    def __init__(self, read_frame: Callable[[], Tuple[bool, Any]],
+                 process_frame: Callable[[Any, StageTimer], Any]):
+        self.read_frame = read_frame
+        self.process_frame = process_frame
+        self.frames = LatestSlot()
+        self.results = LatestSlot()
+        self.timer = StageTimer()
+        self.capture_rate = RateMeter()
+        self.processing_rate = RateMeter()
+        self.dropped_frames = 0
+        self.error: Optional[str] = None
+        self._running = threading.Event()
+        self._threads = []
+
+    @property
+    def running(self) -> bool:
+        return self._running.is_set()
+
+    def start(self):
+        self._running.set()
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name="captura", daemon=True),
+            threading.Thread(target=self._processing_loop, name="processamento", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        self._running.clear()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _fail(self, message: str):
+        self.error = message
+        self._running.clear()
+        # Acorda quem estiver esperando por um frame novo
+        self.frames.put(None)
+
+    def _capture_loop(self):
+        while self._running.is_set():
+            ret, frame = self.read_frame()
+            if not ret:
+                self._fail("Erro ao ler o frame da câmera")
+                return
+            self.frames.put(frame)
+            self.capture_rate.tick()
+
+    def _processing_loop(self):
+        version = 0
+        while self._running.is_set():
+            new_version, frame = self.frames.get(version, timeout=0.5)
+            if frame is None:
+                continue
+            # Frames publicados enquanto o anterior era processado foram descartados
+            self.dropped_frames += max(0, new_version - version - 1)
+            version = new_version
+
+            try:
+                with self.timer.stage("total"):
+                    result = self.process_frame(frame, self.timer)
+            except Exception as e:
+                self._fail(f"Erro no processamento: {str(e)}")
+                return
+            self.results.put(result)
+            self.processing_rate.tick()
+
+    def stats(self) -> dict:
+        return {
+            "capture_fps": self.capture_rate.rate,
+            "processing_fps": self.processing_rate.rate,
+            "dropped_frames": self.dropped_frames,
+            "stage_latency_ms": self.timer.snapshot(),
+        }